@@ -5,38 +5,93 @@ Last updated: July, 2016
 Provides class for accessing LexSemTM
 """
 
+from array import array
+from collections import namedtuple, OrderedDict
 import csv
-import json
+from fnmatch import fnmatch
+import mmap
+from multiprocessing.pool import ThreadPool
 import os
-import subprocess
+import pickle
+import re
+import tarfile
+import threading
+import zlib
+
+# use a faster json decoder if one is installed (asking ujson to parse
+# floats exactly as stdlib json does, since by default it rounds them)
+try:
+    import ujson
+
+    def json_loads(s):
+        return ujson.loads(s, precise_float=True)
+except ImportError:
+    from json import loads as json_loads
 
 DEBUG = True
 
-def get_reader(lexsemtm_path):
+# suffix of sidecar file storing offsets of members within data archive
+TAR_INDEX_SUFFIX = ".idx"
+# suffix of sidecar files storing parsed lemma and vocab index files
+PARSED_CACHE_SUFFIX = ".pkl"
+INDEXED_MEMBER_SUFFIXES = (".tm.json.gz", ".sdist.tab")
+# data archive member names, capturing lemma ID and member type suffix
+MEMBER_NAME_PATTERN = re.compile(r"^[^.]+\.[^.]+\.(\d+)\."
+                                 r"(tm\.json\.gz|sdist\.tab)$")
+TM_MEMBER_TYPE = "tm.json.gz"
+
+# wbits value for zlib to decode data with a gzip header
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# default maximum number of topic models kept in memory by a reader (kept
+# small, as parsed topic models can be large; 0 disables caching)
+TOPIC_MODEL_CACHE_SIZE = 16
+
+# typecode of arrays holding sparse topic model ID's and counts (32-bit int)
+SPARSE_TYPECODE = "i"
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def get_reader(lexsemtm_path, topic_model_cache_size=TOPIC_MODEL_CACHE_SIZE):
     """
     Obtain LexSemTMReader object
 
     :param lexsemtm_path: directory containing LexSemTM data and index files
+    :param topic_model_cache_size: maximum number of recently used topic
+        models to keep in memory
     :return: LexSemTMReader object
     """
-    return LexSemTMReader(lexsemtm_path)
+    return LexSemTMReader(lexsemtm_path, topic_model_cache_size)
 
 
 class LexSemTMReader:
     """
     Class for accessing LexSemTM
     """
-    def __init__(self, lexsemtm_dir):
+    def __init__(self, lexsemtm_dir,
+                 topic_model_cache_size=TOPIC_MODEL_CACHE_SIZE):
         """
         :param lexsemtm_dir: directory containing LexSemTM data and index files
+        :param topic_model_cache_size: maximum number of recently used topic
+            models to keep in memory
         """
         self.lexsemtm_dir = lexsemtm_dir
         self.all_lemmas = {}
         self.all_lemma_indices = {}
         self.all_lemma_freqs = {}
         self.all_sense_dists = {}
-        self.all_topic_models = {}
+        self.all_sense_dists_loaded = set()
+        self.all_topic_models = OrderedDict()
+        self.topic_model_cache_size = topic_model_cache_size
+        self.topic_model_cache_hits = 0
+        self.topic_model_cache_misses = 0
+        self.topic_model_cache_lock = threading.Lock()
         self.vocab_lists = {}
+        self.data_tars = {}
+        self.data_mmaps = {}
+        self.tm_offsets = {}
+        self.sdist_offsets = {}
 
     def get_lemma_names(self, lang="en", which_version="s"):
         """
@@ -68,6 +123,17 @@ class LexSemTMReader:
             self._load_lemma_info_file(lang, which_version)
         return self.all_lemma_freqs[key][lemma]
 
+    def get_vocab(self, lang="en"):
+        """
+        Obtain LexSemTM vocabulary for given language
+
+        :param lang: which language to obtain vocabulary of (default: "en")
+        :return: list of words, indexed by word ID
+        """
+        if lang not in self.vocab_lists:
+            self._load_vocab_file(lang)
+        return self.vocab_lists[lang]
+
     def get_sense_dist(self, lemma, lang="en", which_version="s"):
         """
         Obtain LexSemTM sense distribution for given lemma
@@ -80,11 +146,30 @@ class LexSemTMReader:
             to probability)
         """
         key = (lang, which_version)
-        if key not in self.all_sense_dists:
-            self._load_all_sense_dists(lang, which_version)
+        if key not in self.all_sense_dists or \
+           lemma not in self.all_sense_dists[key]:
+            self._load_sense_dist(lemma, lang, which_version)
         return self.all_sense_dists[key][lemma]
 
-    def get_topic_model(self, lemma, lang="en", which_version="s"):
+    def get_all_sense_dists(self, lang="en", which_version="s"):
+        """
+        Obtain LexSemTM sense distributions for all lemmas
+
+        :param lang: which language to obtain sense distributions for
+            (default: "en")
+        :param which_version: which version of LexSemTM to obtain sense
+            distributions from (default: "s")
+        :return: dict mapping lemma to sense distribution (of type dict,
+            mapping sense name to probability)
+        """
+        key = (lang, which_version)
+        if key not in self.all_sense_dists_loaded:
+            self._load_all_sense_dists(lang, which_version)
+            self.all_sense_dists_loaded.add(key)
+        return self.all_sense_dists[key]
+
+    def get_topic_model(self, lemma, lang="en", which_version="s",
+                        sparse=False):
         """
         Obtain LexSemTM topic model for given lemma
 
@@ -92,29 +177,132 @@ class LexSemTMReader:
         :param lang: which language lemma belongs to (default: "en")
         :param which_version: which version of LexSemTM lemma belongs to
             (default: "s")
+        :param sparse: if True, counts are returned in compact sparse form
+            (default: False); doc-topic counts are a dict containing a sorted
+            list of topic ID's ("topic_ids"), and parallel integer arrays of
+            document numbers ("docs"), indices into topic ID list ("topics")
+            and counts ("counts"), and topic-word counts map each topic ID to
+            a tuple of parallel integer arrays of word ID's and counts (word
+            ID's can be mapped to words using get_vocab)
+        :return: topic model output, consisting of dict containing
+            doc-topic counts and topic-word counts (recently used topic
+            models are cached, so the same dict may be returned again)
+        """
+        # keep least recently used topic model at front of cache
+        # (lock is only held for cache updates, not while loading)
+        cache_key = (lemma, lang, which_version, sparse)
+        with self.topic_model_cache_lock:
+            try:
+                tm = self.all_topic_models.pop(cache_key)
+                self.topic_model_cache_hits += 1
+                self.all_topic_models[cache_key] = tm
+                return tm
+            except KeyError:
+                self.topic_model_cache_misses += 1
+        tm = self._load_topic_model(lemma, lang, which_version, sparse)
+        with self.topic_model_cache_lock:
+            self.all_topic_models[cache_key] = tm
+            if len(self.all_topic_models) > self.topic_model_cache_size:
+                self.all_topic_models.popitem(last=False)
+        return tm
+
+    def get_topic_models(self, lemmas, lang="en", which_version="s",
+                         sparse=False, num_threads=None):
+        """
+        Obtain LexSemTM topic models for several lemmas, loading them in
+        parallel (decompression releases the GIL)
+
+        :param lemmas: list of lemmas to obtain topic models of
+        :param lang: which language lemmas belong to (default: "en")
+        :param which_version: which version of LexSemTM lemmas belong to
+            (default: "s")
+        :param sparse: whether to return counts in sparse form (see
+            get_topic_model) (default: False)
+        :param num_threads: number of threads to load topic models with
+            (if None, use number of CPUs)
+        :return: dict mapping lemma to topic model output (see
+            get_topic_model)
+        """
+        # load shared indexes up front, so worker threads only read them
+        key = (lang, which_version)
+        if key not in self.tm_offsets:
+            self._load_tar_index(lang, which_version)
+        if lang not in self.vocab_lists:
+            self._load_vocab_file(lang)
+        self._get_data_mmap(lang, which_version)
+
+        def get_lemma_topic_model(lemma_):
+            return self.get_topic_model(lemma_, lang, which_version, sparse)
+
+        pool = ThreadPool(num_threads)
+        try:
+            topic_models = pool.map(get_lemma_topic_model, lemmas)
+        finally:
+            pool.close()
+            pool.join()
+        return dict(zip(lemmas, topic_models))
+
+    def cache_info(self):
+        """
+        Obtain statistics for cache of topic models
+
+        :return: CacheInfo tuple containing cache hits, cache misses, maximum
+            cache size and current cache size
+        """
+        return CacheInfo(self.topic_model_cache_hits,
+                         self.topic_model_cache_misses,
+                         self.topic_model_cache_size,
+                         len(self.all_topic_models))
+
+    def cache_clear(self):
+        """
+        Clear cached topic models and sense distributions (and reset cache
+        statistics)
+
+        :return: None
+        """
+        with self.topic_model_cache_lock:
+            self.all_topic_models.clear()
+            self.topic_model_cache_hits = 0
+            self.topic_model_cache_misses = 0
+        self.all_sense_dists.clear()
+        self.all_sense_dists_loaded.clear()
+
+    def _load_topic_model(self, lemma, lang, which_version, sparse):
+        """
+        Load LexSemTM topic model for given lemma from data archive
+
+        :param lemma: lemma to obtain topic model of
+        :param lang: language of lemma
+        :param which_version: version of LexSemTM lemma belongs to
+        :param sparse: whether to return counts in sparse form
         :return: topic model output, consisting of dict containing
             doc-topic counts and topic-word counts
         """
-        # extract topic model raw string from archive
+        # read compressed topic model directly from its offset in archive
         key = (lang, which_version)
-        if key not in self.all_lemma_indices:
-            self._load_lemma_info_file(lang, which_version)
-        lemma_id = self.all_lemma_indices[key][lemma]
-        tm_fname = "%s.%s.%08d.tm.json.gz" % (lang, which_version, lemma_id)
-        tar_path = os.path.join(self.lexsemtm_dir, "%s.%s.data.tar" % key)
-        extract_cmd_1 = ["tar", "-xOf", tar_path, tm_fname]
-        extract_cmd_2 = ["gunzip"]
-        p1 = subprocess.Popen(extract_cmd_1, stdout=subprocess.PIPE)
-        p2 = subprocess.Popen(extract_cmd_2, stdout=subprocess.PIPE,
-                              stdin=p1.stdout)
-        tm_json_str = p2.stdout.read()
+        if key not in self.tm_offsets:
+            self._load_tar_index(lang, which_version)
+        offset, size = self.tm_offsets[key][lemma]
+        data_mmap = self._get_data_mmap(lang, which_version)
+        tm_json_str = zlib.decompress(data_mmap[offset:offset + size],
+                                      GZIP_WBITS)
 
         # convert json string to usable tm object
         # (doc-topic counts and topic-word counts)
-        try:
-            tm_json = json.loads(tm_json_str)
-        except ValueError:
-            return tm_json_str
+        tm_json = json_loads(tm_json_str)
+        if sparse:
+            # keep counts (and word ID's) as packed 32-bit integers
+            doc_topic_counts = self._make_sparse_doc_topic_counts(
+                tm_json["doc_topic_counts"])
+            topic_word_counts = {}
+            for t, word_counts in tm_json["topic_word_counts"].iteritems():
+                topic_word_counts[t] = (
+                    array(SPARSE_TYPECODE, word_counts["word_ids"]),
+                    array(SPARSE_TYPECODE, word_counts["counts"]))
+            return {"doc_topic_counts": doc_topic_counts,
+                    "topic_word_counts": topic_word_counts}
+
         if lang not in self.vocab_lists:
             self._load_vocab_file(lang)
         vocab_list = self.vocab_lists[lang]
@@ -122,13 +310,165 @@ class LexSemTMReader:
         for d, topic_counts in enumerate(tm_json["doc_topic_counts"]):
             doc_topic_counts["d_%06d" % d] = topic_counts
         topic_word_counts = {}
+        vocab_lookup = vocab_list.__getitem__
         for t, word_counts in tm_json["topic_word_counts"].iteritems():
-            topic_word_counts[t] = {vocab_list[w]: c
-                                    for w, c in zip(word_counts["word_ids"],
-                                                    word_counts["counts"])}
+            # map/zip/dict run as C loops, avoiding per-word bytecode
+            words = map(vocab_lookup, word_counts["word_ids"])
+            topic_word_counts[t] = dict(zip(words, word_counts["counts"]))
         return {"doc_topic_counts": doc_topic_counts,
                 "topic_word_counts": topic_word_counts}
 
+    @staticmethod
+    def _make_sparse_doc_topic_counts(all_topic_counts):
+        """
+        Convert doc-topic counts into sparse (coordinate) form
+
+        :param all_topic_counts: list containing dict of topic counts for
+            each document
+        :return: dict containing sorted list of topic ID's, and arrays of
+            document numbers, topic indices and counts
+        """
+        topic_ids = sorted({t for topic_counts in all_topic_counts
+                            for t in topic_counts})
+        topic_indices = {t: i for i, t in enumerate(topic_ids)}
+        docs = array(SPARSE_TYPECODE)
+        topics = array(SPARSE_TYPECODE)
+        counts = array(SPARSE_TYPECODE)
+        for d, topic_counts in enumerate(all_topic_counts):
+            for t, count in topic_counts.iteritems():
+                docs.append(d)
+                topics.append(topic_indices[t])
+                counts.append(count)
+        return {"topic_ids": topic_ids, "docs": docs, "topics": topics,
+                "counts": counts}
+
+    def _get_data_tar(self, lang, which_version):
+        """
+        Obtain opened LexSemTM data archive for given language/version
+        combination (archive is opened once, and its member index reused
+        across calls)
+
+        :param lang: language of data archive
+        :param which_version: version of LexSemTM of data archive
+        :return: tarfile.TarFile object
+        """
+        key = (lang, which_version)
+        if key not in self.data_tars:
+            tar_path = os.path.join(self.lexsemtm_dir, "%s.%s.data.tar" % key)
+            self.data_tars[key] = tarfile.open(tar_path, mode="r")
+        return self.data_tars[key]
+
+    def _get_data_mmap(self, lang, which_version):
+        """
+        Obtain read-only memory map of LexSemTM data archive for given
+        language/version combination (members are then sliced straight from
+        the page cache)
+
+        :param lang: language of data archive
+        :param which_version: version of LexSemTM of data archive
+        :return: mmap.mmap object
+        """
+        key = (lang, which_version)
+        if key not in self.data_mmaps:
+            tar_path = os.path.join(self.lexsemtm_dir, "%s.%s.data.tar" % key)
+            fd = os.open(tar_path, os.O_RDONLY)
+            data_mmap = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+            os.close(fd)
+            # lemma lookups are scattered, so read-ahead is wasted
+            if hasattr(data_mmap, "madvise"):
+                data_mmap.madvise(mmap.MADV_RANDOM)
+            self.data_mmaps[key] = data_mmap
+        return self.data_mmaps[key]
+
+    def _load_tar_index(self, lang, which_version):
+        """
+        Load index mapping data archive member names to their (offset, size)
+        within the archive, building it with a single pass over the archive
+        and saving it alongside the archive if no up-to-date index exists,
+        then resolve member names to lemmas for topic model and sense
+        distribution lookups
+
+        :param lang: language of data archive
+        :param which_version: version of LexSemTM of data archive
+        :return: None
+        """
+        key = (lang, which_version)
+        tar_path = os.path.join(self.lexsemtm_dir, "%s.%s.data.tar" % key)
+        index_path = tar_path + TAR_INDEX_SUFFIX
+        tar_index = self._load_cache(index_path, tar_path)
+        if tar_index is None:
+            tar_index = {}
+            for info in self._get_data_tar(lang, which_version):
+                if info.name.endswith(INDEXED_MEMBER_SUFFIXES):
+                    tar_index[info.name] = (info.offset_data, info.size)
+            self._save_cache(tar_index, index_path)
+
+        # key offsets by lemma, so lookups need no member name formatting
+        if key not in self.all_lemma_indices:
+            self._load_lemma_info_file(lang, which_version)
+        id_lemmas = {lemma_id: lemma for lemma, lemma_id
+                     in self.all_lemma_indices[key].iteritems()}
+        tm_offsets = {}
+        sdist_offsets = {}
+        for member_name, member_loc in tar_index.iteritems():
+            match = MEMBER_NAME_PATTERN.match(member_name)
+            if match is None:
+                continue
+            lemma = id_lemmas.get(int(match.group(1)))
+            if lemma is None:
+                continue
+            if match.group(2) == TM_MEMBER_TYPE:
+                tm_offsets[lemma] = member_loc
+            else:
+                sdist_offsets[lemma] = member_loc
+        self.tm_offsets[key] = tm_offsets
+        self.sdist_offsets[key] = sdist_offsets
+
+    @staticmethod
+    def _load_cache(cache_path, source_path):
+        """
+        Load pickled data previously derived from given source file
+
+        :param cache_path: path of pickled cache file
+        :param source_path: path of file the cached data was derived from
+        :return: cached data (or None if there is no cache file at least as
+            recent as the source file)
+        """
+        if not os.path.exists(cache_path) or \
+           os.path.getmtime(cache_path) < os.path.getmtime(source_path):
+            return None
+        try:
+            with open(cache_path, "rb") as fp:
+                return pickle.load(fp)
+        except Exception:
+            # unreadable (e.g. truncated or corrupt) cache file, so treat as
+            # cache miss and let it be rebuilt (unpickling bad data can raise
+            # EOFError, UnpicklingError and various other exception types)
+            return None
+
+    @staticmethod
+    def _save_cache(data, cache_path):
+        """
+        Save pickled data to cache file (written to temporary file first and
+        renamed, so that other processes never see partial file)
+
+        :param data: data to save
+        :param cache_path: path of pickled cache file
+        :return: None
+        """
+        tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+        try:
+            fp = open(tmp_path, "wb")
+            pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+            fp.close()
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError):
+            # data is only a cache, so carry on if it cannot be saved
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
     def _load_lemma_info_file(self, lang, which_version):
         """
         Load LexSemTM lemma metadata for given language/version combination
@@ -140,17 +480,30 @@ class LexSemTMReader:
         key = (lang, which_version)
         lemma_info_fname = "%s.%s.lemmas.tab" % key
         lemma_info_path = os.path.join(self.lexsemtm_dir, lemma_info_fname)
+        cache_path = lemma_info_path + PARSED_CACHE_SUFFIX
+        lemma_info = self._load_cache(cache_path, lemma_info_path)
+        if lemma_info is not None:
+            (self.all_lemmas[key], self.all_lemma_indices[key],
+             self.all_lemma_freqs[key]) = lemma_info
+            return
+
         fp = open(lemma_info_path)
-        reader = csv.DictReader(fp, delimiter="\t", quoting=csv.QUOTE_NONE)
-        self.all_lemma_indices[key] = {}
-        self.all_lemma_freqs[key] = {}
-        self.all_lemmas[key] = []
-        for row in reader:
-            lemma = row["lemma"]
-            self.all_lemmas[key].append(lemma)
-            self.all_lemma_indices[key][lemma] = int(row["lemma-id"])
-            self.all_lemma_freqs[key][lemma] = int(row["num-usages"])
+        reader = csv.reader(fp, delimiter="\t", quoting=csv.QUOTE_NONE)
+        header = next(reader)
+        lemma_col = header.index("lemma")
+        lemma_id_col = header.index("lemma-id")
+        num_usages_col = header.index("num-usages")
+        rows = list(reader)
         fp.close()
+        # extract whole columns, then build index dicts in C with dict/zip
+        lemmas = [row[lemma_col] for row in rows]
+        lemma_ids = [int(row[lemma_id_col]) for row in rows]
+        lemma_freqs = [int(row[num_usages_col]) for row in rows]
+        self.all_lemmas[key] = lemmas
+        self.all_lemma_indices[key] = dict(zip(lemmas, lemma_ids))
+        self.all_lemma_freqs[key] = dict(zip(lemmas, lemma_freqs))
+        self._save_cache((self.all_lemmas[key], self.all_lemma_indices[key],
+                          self.all_lemma_freqs[key]), cache_path)
 
     def _load_vocab_file(self, lang):
         """
@@ -161,15 +514,27 @@ class LexSemTMReader:
         """
         vocab_fname = "%s.vocab.tab" % lang
         vocab_path = os.path.join(self.lexsemtm_dir, vocab_fname)
+        cache_path = vocab_path + PARSED_CACHE_SUFFIX
+        vocab_list = self._load_cache(cache_path, vocab_path)
+        if vocab_list is not None:
+            self.vocab_lists[lang] = vocab_list
+            return
+
         fp = open(vocab_path)
-        reader = csv.DictReader(fp, delimiter="\t", quoting=csv.QUOTE_NONE)
-        vocab_map = {}
-        for row in reader:
-            token_id = int(row["token-id"])
-            token = row["token"]
-            vocab_map[token_id] = token
-        self.vocab_lists[lang] = vocab_map
+        reader = csv.reader(fp, delimiter="\t", quoting=csv.QUOTE_NONE)
+        header = next(reader)
+        token_id_col = header.index("token-id")
+        token_col = header.index("token")
+        rows = list(reader)
         fp.close()
+        token_ids = [int(row[token_id_col]) for row in rows]
+        tokens = [row[token_col] for row in rows]
+        # token ID's are dense, so store vocabulary as list indexed by ID
+        vocab_list = [None] * (max(token_ids) + 1)
+        for token_id, token in zip(token_ids, tokens):
+            vocab_list[token_id] = token
+        self.vocab_lists[lang] = vocab_list
+        self._save_cache(vocab_list, cache_path)
 
     def _load_all_sense_dists(self, lang, which_version):
         """
@@ -185,19 +550,52 @@ class LexSemTMReader:
         if key not in self.all_sense_dists:
             self.all_sense_dists[key] = {}
         sense_dists = self.all_sense_dists[key]
-        tar_path = os.path.join(self.lexsemtm_dir, "%s.%s.data.tar" % key)
         sdist_pattern = "%s.%s.*.sdist.tab" % key
-        extract_cmd = ["tar", "--wildcards", "-xOf", tar_path, sdist_pattern]
-        p = subprocess.Popen(extract_cmd, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        while True:
-            line = p.stdout.readline().strip()
-            if not line:
-                break
-            sense_id, prob = line.split()
-            if sense_id == "sense-name":
+        data_tar = self._get_data_tar(lang, which_version)
+        for info in data_tar:
+            if not fnmatch(info.name, sdist_pattern):
                 continue
-            lemma = ".".join(sense_id.split(".")[:-1])
-            if lemma not in sense_dists:
-                sense_dists[lemma] = {}
-            sense_dists[lemma][sense_id] = float(prob)
+            # read whole member at once, rather than line by line
+            sdist_fp = data_tar.extractfile(info)
+            sdist_data = sdist_fp.read()
+            sdist_fp.close()
+            self._parse_sense_dist_data(sdist_data, sense_dists)
+
+    def _load_sense_dist(self, lemma, lang, which_version):
+        """
+        Parse single sense distribution from LexSemTM data file, reading
+        only the archive member for given lemma
+
+        :param lemma: lemma to obtain sense distribution of
+        :param lang: language of lemma
+        :param which_version: version of LexSemTM lemma belongs to
+        :return: None
+        """
+        key = (lang, which_version)
+        if key not in self.sdist_offsets:
+            self._load_tar_index(lang, which_version)
+        offset, size = self.sdist_offsets[key][lemma]
+        data_mmap = self._get_data_mmap(lang, which_version)
+        sense_dists = self.all_sense_dists.setdefault(key, {})
+        self._parse_sense_dist_data(data_mmap[offset:offset + size],
+                                    sense_dists)
+
+    @staticmethod
+    def _parse_sense_dist_data(sdist_data, sense_dists):
+        """
+        Parse contents of sense distribution archive member
+
+        :param sdist_data: string contents of sense distribution member
+        :param sense_dists: dict mapping lemma to sense distribution, which
+            parsed sense probabilities are added to
+        :return: None
+        """
+        # member is a two column table, so split it in one pass and
+        # take alternate tokens as columns (skipping header row)
+        tokens = sdist_data.split()
+        if tokens and tokens[0] == "sense-name":
+            tokens = tokens[2:]
+        probs = map(float, tokens[1::2])
+        for sense_id, prob in zip(tokens[0::2], probs):
+            lemma = sense_id.rpartition(".")[0]
+            sense_dists.setdefault(lemma, {})[sense_id] = prob
@@ -9,9 +9,28 @@ containing lemma usages with gold-standard sense annotations
 import argparse
 from collections import Counter
 import csv
+from multiprocessing import Pool
 import os
 
 
+def count_annotated_senses(path):
+    """
+    Count gold-standard sense annotations in single annotations file
+
+    :param path: path to annotations file (named LEMMA.csv)
+    :return: tuple containing lemma and dict mapping sense to frequency
+    """
+    fp = open(path, 'r')
+    reader = csv.reader(fp)
+    sense_col = next(reader).index("sense_id")
+    # count senses as rows are read, without building a list first
+    sense_counts = Counter()
+    sense_counts.update(row[sense_col] for row in reader)
+    fp.close()
+    lemma = ".".join(os.path.basename(path).split(".")[:-1])
+    return lemma, dict(sense_counts)
+
+
 def main():
     """
     Main function for running script
@@ -24,27 +43,31 @@ def main():
                         help="directory containing sense annotations")
     parser.add_argument("--save_path", required=True,
                         help="path to save gold standard distributions")
+    parser.add_argument("--nprocs", type=int, default=None,
+                        help="number of processes used to read annotations "
+                             "(default: number of CPUs)")
     args = parser.parse_args()
 
     # load gold standard distributions
     annotations_dir = args.annotations_dir
+    paths = [os.path.join(annotations_dir, fname)
+             for fname in os.listdir(annotations_dir)]
     gold_dists = {}
-    for fname in os.listdir(annotations_dir):
-        path = os.path.join(annotations_dir, fname)
-        fp = open(path, 'r')
-        reader = csv.DictReader(fp)
-        sense_counts = Counter([row["sense_id"] for row in reader])
-        lemma = ".".join(fname.split(".")[:-1])
-        gold_dists[lemma] = {sense: count for sense, count
-                             in sense_counts.iteritems()}
-        fp.close()
-
-    # save to output file
-    save_fp = open(args.save_path, 'w')
+    pool = Pool(args.nprocs)
+    for lemma, gold_dist in pool.imap_unordered(count_annotated_senses,
+                                                paths, chunksize=32):
+        gold_dists[lemma] = gold_dist
+    pool.close()
+    pool.join()
+
+    # save to output file, writing all lines at once
+    lines = []
     for lemma, gold_dist in sorted(gold_dists.iteritems()):
-        for sense_id, freq in sorted(gold_dist.iteritems()):
-            save_fp.write("%s %d\n" % (sense_id, freq))
-        save_fp.write("\n")
+        lines.extend("%s %d\n" % (sense_id, freq)
+                     for sense_id, freq in sorted(gold_dist.iteritems()))
+        lines.append("\n")
+    save_fp = open(args.save_path, 'w')
+    save_fp.writelines(lines)
     save_fp.close()
 
 
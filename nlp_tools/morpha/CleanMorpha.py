@@ -12,8 +12,25 @@ Author:         Jey Han Lau
 Date:           Nov 10
 """
 
+import re
 import sys
 
+#special-case tokens, all rewritten in a single regex pass:
+#-convert brackets
+#-ignore --cnumb--
+SPECIAL_TOKENS = {
+    "-lrb-": "(",
+    "-rrb-": ")",
+    "--cnumb--": "",
+    "--cnumbs--": "",
+    "--onumb--": "",
+    "--noun--": "",
+}
+SPECIAL_PATTERN = re.compile("-lrb-|-rrb-|--cnumbs?--|--onumb--|--noun--")
+
+def replace_special(match):
+    return SPECIAL_TOKENS[match.group()]
+
 if len(sys.argv) != 1 and len(sys.argv) != 2:
     print "Usage CleanMorpha.py [boundary_symbol] < morpha_formatted_text > pretty_text"
     raise SystemExit
@@ -30,25 +47,20 @@ for line in sys.stdin:
 
     else:
         tokens = line.strip().split()
-        string = ""
+        #collect output for line, and write it with a single call
+        parts = []
         for i, token in enumerate(tokens):
             tail = token.rfind("_")
 
             if tail != -1:
-                #a few special cases:
-                #-convert brackets
-                #-ignore --cnumb--
-                output_token = token[:tail].lower().replace("-lrb-", "(")
-                output_token = output_token.replace("-rrb-", ")")
-                output_token = output_token.replace("--cnumb--", "")
-                output_token = output_token.replace("--cnumbs--", "")
-                output_token = output_token.replace("--onumb--", "")
-                output_token = output_token.replace("--noun--", "")
+                output_token = SPECIAL_PATTERN.sub(replace_special,
+                                                   token[:tail].lower())
                 if len(output_token) > 0:
-                    sys.stdout.write(output_token)
+                    parts.append(output_token)
                     if (i != (len(tokens)-1)):
-                        sys.stdout.write(" ")
+                        parts.append(" ")
 
         if pageboundary == "":
-            sys.stdout.write("\n")
+            parts.append("\n")
+        sys.stdout.write("".join(parts))
 
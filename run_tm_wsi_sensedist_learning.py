@@ -6,30 +6,67 @@ Main script for running sense distribution learning experiments
 """
 
 import gzip
-import json
 import random
 import csv
-import subprocess
 import sys
 import argparse
 import os
 import gc
 import shutil
-from multiprocessing import Lock, Queue, Process
+from collections import OrderedDict
+from operator import itemgetter
+from multiprocessing import Pool, Queue, Process
+from threading import Thread
 
 from nltk.corpus import wordnet as wn
 
 from senselearn.corpus import DefaultCorpus
 from senselearn.wsi.hdp_runner import HDPRunner
 from senselearn.align import TopicSenseAligner
-from senselearn.wordnet_gloss import get_wordnet_gloss_dists
+from senselearn.wordnet_gloss import get_wordnet_gloss_dists, \
+    get_wordnet_gloss_dists_batch
 from senselearn.errors import WSIRepeat, ExperimentFail
 from senselearn.wsi.hca_runner import HCARunner
 from senselearn.wsi_operator import WSIOptions, WSIOperator
 from senselearn.probability import js_divergence
 
+# use scandir to list directories if available (python 3.5+, or backport)
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# use a faster json decoder if one is installed (ujson is only used for
+# decoding, asking it to parse floats exactly as stdlib json does, since by
+# default it rounds them)
+from json import dumps as json_dumps
+try:
+    import ujson
+
+    def json_loads(s):
+        return ujson.loads(s, precise_float=True)
+except ImportError:
+    from json import loads as json_loads
+
 MIN_BOOTSTRAPPING_SIZE = 500
 
+# suffix of topic modelling json files, and of small summary json files
+# saved alongside them (containing only the fields needed for evaluation)
+TM_JSON_SUFFIX = ".tm.json"
+TM_SUMMARY_SUFFIX = ".summary.json"
+
+# number of jobs a worker runs between full garbage collections (corpora and
+# topic models are freed by reference counting as soon as a job ends, so
+# collecting after every job is unnecessary)
+GC_JOB_INTERVAL = 50
+
+# names of streams that log messages can be written to
+LOG_STDOUT = "stdout"
+LOG_STDERR = "stderr"
+
 
 def parse_wsi_options_file(options_file_path):
     """
@@ -39,15 +76,13 @@ def parse_wsi_options_file(options_file_path):
     :return: dictionary containing options
     """
     default_options = {}
-    fp = open(options_file_path)
-    for line in fp.readlines():
-        line_parts = line.split()
-        key = line_parts[0]
-        if len(line_parts) > 1:
-            val = " ".join(line_parts[1:])
-        else:
-            val = None
-        default_options[key] = val
+    with open(options_file_path) as fp:
+        for line in fp:
+            line_parts = line.split()
+            if len(line_parts) > 1:
+                default_options[line_parts[0]] = " ".join(line_parts[1:])
+            else:
+                default_options[line_parts[0]] = None
     return default_options
 
 
@@ -59,20 +94,15 @@ def load_gold_dists(gold_dists_file):
     :return: dictionary mapping lemma to gold-standard distribution (as a dict)
     """
     gold_dists = {}
-    fp = open(gold_dists_file, 'r')
-    for line in fp.xreadlines():
-        parts = line.split()
-        if len(parts) <= 1:
-            continue
-        sense = parts[0]
-        freq = float(parts[1])
-        lemma = ".".join(sense.split(".")[:-1])
-        try:
-            gold_dist = gold_dists[lemma]
-        except KeyError:
-            gold_dist = {}
-            gold_dists[lemma] = gold_dist
-        gold_dist[sense] = freq
+    setdefault = gold_dists.setdefault
+    with open(gold_dists_file, 'r') as fp:
+        for line in fp:
+            parts = line.split()
+            if len(parts) <= 1:
+                continue
+            sense = parts[0]
+            lemma = sense.rpartition(".")[0]
+            setdefault(lemma, {})[sense] = float(parts[1])
     return gold_dists
 
 
@@ -112,9 +142,8 @@ def get_stopwords(lang, stopwords_dir):
     """
     stopwords_fname = "stopwords.%s.txt" % lang
     stopwords_path = os.path.join(stopwords_dir, stopwords_fname)
-    fp = open(stopwords_path)
-    stopwords = {line.strip() for line in fp.xreadlines()}
-    fp.close()
+    with open(stopwords_path) as fp:
+        stopwords = {line.strip() for line in fp}
     return stopwords
 
 
@@ -131,30 +160,44 @@ def load_topic_model_json(tm_path):
         tm_fp = gzip.open(tm_path)
     else:
         tm_fp = open(tm_path)
-    tm_json = json.load(tm_fp)
+    tm_json = json_loads(tm_fp.read())
     tm_fp.close()
     return tm_json
 
 
 def dump_tm_json(tm_output, save_path):
     """
-    Dump topic model structure into json file, and compress using gzip
+    Dump topic model structure into json file, compressed using gzip
 
     :param tm_output: dict containing topic modelling data
-    :param save_path: path to save json object
+    :param save_path: path to save json object (".gz" is appended to this)
     :return: None
     """
-    tm_fp = open(save_path, 'w')
-    json.dump(tm_output, tm_fp)
+    # encode json in one go and write into gzip file (using default
+    # compression level of gzip command)
+    tm_fp = gzip.open(save_path + ".gz", 'wb', compresslevel=6)
+    tm_fp.write(json_dumps(tm_output))
     tm_fp.close()
-    gzip_json_cmd = ["gzip", save_path]
-    p_gzip = subprocess.Popen(gzip_json_cmd, stdout=subprocess.PIPE)
-    p_gzip.stdout.readlines()
+
+
+def load_lemma_corpus(lemma, corpus_dir, stopwords):
+    """
+    Create corpus of usages of single lemma, ready for running TM-WSI
+
+    :param lemma: lemma to create corpus for
+    :param corpus_dir: directory containing lemma usages files
+    :param stopwords: set of stopwords for lemma
+    :return: DefaultCorpus object, with usages scanned and vocab prepared
+    """
+    corpus = DefaultCorpus(lemma, corpus_dir, stopwords)
+    corpus.scan_lemma_usages(lemma)
+    corpus.prepare_vocab()
+    return corpus
 
 
 def run_tm_wsi(lemma, tm_dir, tm, results_dir, corpus_dir, stopwords,
-               write_lock, bootstrapping, model_num, aligner, wsi_options,
-               keep_wsi_data):
+               log_queue, bootstrapping, model_num, aligner, wsi_options,
+               keep_wsi_data, corpus=None):
     """
     Runs TM-WSI (HDP-WSI or HCA-WSI) on single lemma
     :param lemma: lemma to run TM-WSI on
@@ -163,7 +206,8 @@ def run_tm_wsi(lemma, tm_dir, tm, results_dir, corpus_dir, stopwords,
     :param results_dir: base directory for storing results
     :param corpus_dir: directory containing lemma usages files
     :param stopwords: set of stopwords for lemma
-    :param write_lock: lock to serialise writing of output
+    :param log_queue: queue of log messages, to be written by log writer
+        process
     :param bootstrapping: whether we are running bootstrapping experiment or
         not (boolean)
     :param model_num: index of model being run (from enumerating all models)
@@ -172,20 +216,19 @@ def run_tm_wsi(lemma, tm_dir, tm, results_dir, corpus_dir, stopwords,
     :param wsi_options: options to supply to HDP or HCA
     :param keep_wsi_data: whether to keep intermediate WSI output (if False,
         intermediate output will be deleted)
+    :param corpus: DefaultCorpus object with usages of lemma already scanned
+        and vocab prepared (if None, corpus is created from usages file)
     :return: None
     """
-    write_lock.acquire()
     if model_num is None:
-        print "processing lemma %s" % lemma
+        log_queue.put((LOG_STDOUT, "processing lemma %s\n" % lemma))
     else:
-        print "processing lemma %s (model num %d)" % (lemma, model_num)
-    sys.stdout.flush()
-    write_lock.release()
+        log_queue.put((LOG_STDOUT, "processing lemma %s (model num %d)\n"
+                       % (lemma, model_num)))
 
     # run WSI on lemma
-    corpus = DefaultCorpus(lemma, corpus_dir, stopwords)
-    corpus.scan_lemma_usages(lemma)
-    corpus.prepare_vocab()
+    if corpus is None:
+        corpus = load_lemma_corpus(lemma, corpus_dir, stopwords)
     if tm == "hca":
         wsi_runner = HCARunner(corpus)
     elif tm == "hdp":
@@ -228,21 +271,15 @@ def run_tm_wsi(lemma, tm_dir, tm, results_dir, corpus_dir, stopwords,
                 num_usages = num_usages_dict[lemma]
             else:
                 num_usages = corpus.get_num_usages_by_lemma(lemma)
-            write_lock.acquire()
-            print("starting wsi for model %s --- %s  "
-                  "(%d uses sampled)" % (model_name, lemma, num_usages))
-            sys.stdout.flush()
-            write_lock.release()
+            log_queue.put((LOG_STDOUT, "starting wsi for model %s --- %s  "
+                           "(%d uses sampled)\n"
+                           % (model_name, lemma, num_usages)))
             tm = operator.run_wsi(wsi_options, all_num_usages=num_usages_dict)
             tm["lemma"] = lemma
             break
         except WSIRepeat as e:
-            write_lock.acquire()
-            sys.stderr.write("WSI repeat for lemma %s, due to "
-                             "reason '%s'\n"
-                             % (lemma, e.message))
-            sys.stdout.flush()
-            write_lock.release()
+            log_queue.put((LOG_STDERR, "WSI repeat for lemma %s, due to "
+                           "reason '%s'\n" % (lemma, e.message)))
             # delete output_dir and input_path, before trying again
             os.remove(input_path)
             shutil.rmtree(output_dir)
@@ -253,28 +290,27 @@ def run_tm_wsi(lemma, tm_dir, tm, results_dir, corpus_dir, stopwords,
         tm["sense_dist"] = sense_dist
 
     # save json file
-    tm_path = os.path.join(results_dir, "tm_output", model_name + ".tm.json")
+    tm_path = os.path.join(results_dir, "tm_output",
+                           model_name + TM_JSON_SUFFIX)
     dump_tm_json(tm, tm_path)
+    summary_path = os.path.join(results_dir, "tm_output",
+                                model_name + TM_SUMMARY_SUFFIX)
+    dump_tm_summary_json(tm, summary_path)
 
-    # clear corpus object and possibly other files and end
+    # clear possibly other files and end
     if not keep_wsi_data:
         os.remove(input_path)
         shutil.rmtree(output_dir)
-    del corpus
-    gc.collect()
-    write_lock.acquire()
-    print "finished model %s" % model_name
-    sys.stdout.flush()
-    write_lock.release()
+    log_queue.put((LOG_STDOUT, "finished model %s\n" % model_name))
 
 
-def run_process_worker(job_queue, results_dir, corpus_dir, wn_version,
+def run_process_worker(jobs, results_dir, corpus_dir, wn_version,
                        tools_dir, tm, tm_dir, wsi_options, do_bootstrapping,
-                       do_alignment, keep_wsi_data, write_lock):
+                       do_alignment, keep_wsi_data, log_queue, all_stopwords):
     """
     Function for single sense distribution learning experiment worker
 
-    :param job_queue: Queue of jobs to run
+    :param jobs: list of (lemma, model number) jobs for this worker to run
     :param results_dir: base directory for storing results
     :param corpus_dir: directory containing lemma usages files
     :param wn_version: version of WordNet to be used (name of WordNet
@@ -288,44 +324,155 @@ def run_process_worker(job_queue, results_dir, corpus_dir, wn_version,
     :param do_alignment: whether to perform alignment or not (boolean)
     :param keep_wsi_data: whether to keep intermediate WSI output (if False,
         intermediate output will be deleted)
-    :param write_lock: lock to serialise writing of output
+    :param log_queue: queue of log messages, to be written by log writer
+        process
+    :param all_stopwords: dict mapping language code to set of stopwords
+        (for every language of lemmas in jobs)
     :return: None
     """
-    all_stopwords = {}
+    # obtain gloss distributions for all lemmas of worker at once, so that
+    # NLP tools are only started once (any lemmas missing from this batch
+    # are retried individually, to report their errors)
+    batch_gloss_dists = {}
     if do_alignment:
         aligner = TopicSenseAligner()
+        job_lemmas = list(OrderedDict.fromkeys(lemma for lemma, _ in jobs))
+        try:
+            batch_gloss_dists = get_wordnet_gloss_dists_batch(
+                job_lemmas, wn_version, all_stopwords, tools_dir)
+        except ExperimentFail as e:
+            log_queue.put((LOG_STDERR, "Failure obtaining gloss distributions "
+                           "in batch with message '%s', obtaining them per "
+                           "lemma instead\n\n" % e.message))
     else:
         aligner = None
     lemmas_done = set()
-    # continuously obtain jobs, until all jobs done
-    for lemma, model_num in iter(job_queue.get, "STOP"):
-        lang = lemma.split(".")[-1]
-        try:
-            stopwords = all_stopwords[lang]
-        except KeyError:
-            stopwords = get_stopwords(lang, tools_dir)
-            all_stopwords[lang] = stopwords
+    # bootstrapping trains several models per lemma, so run each lemma's jobs
+    # together and keep only the current lemma's corpus, rather than
+    # re-scanning its usages for every model (sort is stable, so each
+    # lemma's models keep their order)
+    if do_bootstrapping:
+        jobs = sorted(jobs, key=itemgetter(0))
+    corpus_lemma = None
+    lemma_corpus = None
+    for job_num, (lemma, model_num) in enumerate(jobs):
+        if job_num > 0 and job_num % GC_JOB_INTERVAL == 0:
+            gc.collect()
+        stopwords = all_stopwords[lemma.split(".")[-1]]
         # process the lemma
         try:
             # make aligner if necessary
             if do_alignment and lemma not in lemmas_done:
-                gloss_dists = get_wordnet_gloss_dists(lemma, wn_version,
-                                                      stopwords, tools_dir)
+                gloss_dists = batch_gloss_dists.pop(lemma, None)
+                if gloss_dists is None:
+                    gloss_dists = get_wordnet_gloss_dists(
+                        lemma, wn_version, stopwords, tools_dir)
                 aligner.add_lemma_gloss_dists(lemma, gloss_dists)
                 lemmas_done.add(lemma)
+            if do_bootstrapping:
+                if lemma != corpus_lemma:
+                    # free previous lemma's corpus before loading next one
+                    corpus_lemma = None
+                    lemma_corpus = None
+                    lemma_corpus = load_lemma_corpus(lemma, corpus_dir,
+                                                     stopwords)
+                    corpus_lemma = lemma
+                corpus = lemma_corpus
+            else:
+                corpus = None
             run_tm_wsi(lemma, tm_dir, tm, results_dir, corpus_dir, stopwords,
-                       write_lock, do_bootstrapping, model_num, aligner,
-                       wsi_options, keep_wsi_data)
+                       log_queue, do_bootstrapping, model_num, aligner,
+                       wsi_options, keep_wsi_data, corpus)
         except ExperimentFail as e:
             # report error to error log
-            write_lock.acquire()
-            sys.stderr.write("Failure with lemma %s of type '%s' with message "
-                             "'%s' occurred!\n\n" % (lemma, type(e).__name__,
-                                                     e.message))
-            write_lock.release()
+            log_queue.put((LOG_STDERR, "Failure with lemma %s of type '%s' "
+                           "with message '%s' occurred!\n\n"
+                           % (lemma, type(e).__name__, e.message)))
 
 
-def evaluate_results(tm_output_dir, save_path, gold_dists_file):
+def run_log_writer(log_queue):
+    """
+    Function for process writing log messages from all workers (so workers
+    never need to wait on a shared lock to write output)
+
+    :param log_queue: queue of (stream name, message) tuples, ended by None
+    :return: None
+    """
+    for stream_name, message in iter(log_queue.get, None):
+        if stream_name == LOG_STDERR:
+            stream = sys.stderr
+        else:
+            stream = sys.stdout
+        stream.write(message)
+        stream.flush()
+
+
+def make_tm_summary(tm):
+    """
+    Extracts fields needed for evaluation from topic model structure
+
+    :param tm: dict containing topic modelling data
+    :return: dict containing lemma, number of usages, final perplexity (None
+        if no perplexity was recorded) and training time of model (as well
+        as sense distribution, if any)
+    """
+    perplexity_array = tm["perplexity_array"]
+    tm_summary = {
+        "lemma": tm["lemma"],
+        "num_usages": len(tm["doc_topic_counts"]),
+        "final_perplexity": perplexity_array[-1] if perplexity_array else None,
+        "time": tm["time"],
+    }
+    if "sense_dist" in tm:
+        tm_summary["sense_dist"] = tm["sense_dist"]
+    return tm_summary
+
+
+def dump_tm_summary_json(tm_output, save_path):
+    """
+    Dump summary of topic model structure (see make_tm_summary) into json
+    file, so that evaluation does not need to parse the full topic model
+
+    :param tm_output: dict containing topic modelling data
+    :param save_path: path to save json object
+    :return: None
+    """
+    tm_fp = open(save_path, 'wb')
+    tm_fp.write(json_dumps(make_tm_summary(tm_output)))
+    tm_fp.close()
+
+
+def load_tm_summary(tm_path):
+    """
+    Loads fields needed for evaluation for topic modelling json file, from
+    summary json file saved alongside it if there is one (otherwise from the
+    full topic modelling json file)
+
+    :param tm_path: Path to topic modelling json file
+    :return: dict containing lemma, number of usages, final perplexity and
+        training time of model (as well as sense distribution, if any)
+    """
+    # only use summary if it is at least as new as the topic modelling file
+    # (otherwise it may be left over from an older model)
+    for tm_suffix in (TM_JSON_SUFFIX + ".gz", TM_JSON_SUFFIX):
+        if not tm_path.endswith(tm_suffix):
+            continue
+        summary_path = tm_path[:-len(tm_suffix)] + TM_SUMMARY_SUFFIX
+        try:
+            is_fresh = (os.path.getmtime(summary_path)
+                        >= os.path.getmtime(tm_path))
+        except OSError:
+            is_fresh = False
+        if is_fresh:
+            summary_fp = open(summary_path, 'rb')
+            tm_summary = json_loads(summary_fp.read())
+            summary_fp.close()
+            return tm_summary
+        break
+    return make_tm_summary(load_topic_model_json(tm_path))
+
+
+def evaluate_results(tm_output_dir, save_path, gold_dists_file, nprocs=1):
     """
     Evaluate results from sense distribution learning experiment (by producing
     csv file containing evaluation metrics)
@@ -335,25 +482,43 @@ def evaluate_results(tm_output_dir, save_path, gold_dists_file):
     :param save_path: path to save evaluation results to
     :param gold_dists_file: path to file containing gold-standard sense
         distributions
+    :param nprocs: number of processes to load topic modeling outputs with
     :return: None
     """
     gold_dists = load_gold_dists(gold_dists_file)
     all_results = []
     results_keys = ["lemma", "num_usages", "jsd", "semcor_jsd",
                     "final_perplexity", "time"]
-    for fname in os.listdir(tm_output_dir):
-        tm_path = os.path.join(tm_output_dir, fname)
-        tm = load_topic_model_json(tm_path)
+    # semcor jsd only depends on lemma, so compute once per lemma (lemmas
+    # recur for each bootstrap sample)
+    semcor_jsds = {}
+    if scandir is not None:
+        tm_paths = [entry.path for entry in scandir(tm_output_dir)
+                    if entry.is_file()]
+    else:
+        tm_paths = [os.path.join(tm_output_dir, fname)
+                    for fname in os.listdir(tm_output_dir)]
+        tm_paths = [path for path in tm_paths if os.path.isfile(path)]
+    # summary files are loaded along with their topic modelling json file
+    tm_paths = [path for path in tm_paths
+                if not path.endswith(TM_SUMMARY_SUFFIX)]
+    # decompress and parse outputs in parallel, only passing back the
+    # fields needed for evaluation
+    pool = Pool(nprocs)
+    for tm in pool.imap_unordered(load_tm_summary, tm_paths, chunksize=8):
         lemma = tm["lemma"]
+        # models without any recorded perplexity get a blank cell
+        final_perplexity = tm["final_perplexity"]
+        if final_perplexity is None:
+            final_perplexity = ""
         results = {
             "lemma": lemma,
-            "num_usages": len(tm["doc_topic_counts"]),
-            "final_perplexity": tm["perplexity_array"][-1],
+            "num_usages": tm["num_usages"],
+            "final_perplexity": final_perplexity,
             "time": tm["time"],
         }
         if "sense_dist" in tm:
             sense_dist = tm["sense_dist"]
-            semcor_dist = get_semcor_dist(lemma)
             try:
                 gold_dist = gold_dists[lemma]
             except KeyError:
@@ -361,13 +526,18 @@ def evaluate_results(tm_output_dir, save_path, gold_dists_file):
                                  "lemma %s\n\n" % lemma)
                 continue
             results["jsd"] = js_divergence(sense_dist, gold_dist)
-            results["semcor_jsd"] = js_divergence(semcor_dist, gold_dist)
+            if lemma not in semcor_jsds:
+                semcor_dist = get_semcor_dist(lemma)
+                semcor_jsds[lemma] = js_divergence(semcor_dist, gold_dist)
+            results["semcor_jsd"] = semcor_jsds[lemma]
         else:
             results["jsd"] = ""
             results["semcor_jsd"] = ""
         all_results.append(results)
+    pool.close()
+    pool.join()
 
-    all_results.sort(key=lambda r: [r[k] for k in results_keys])
+    all_results.sort(key=itemgetter(*results_keys))
     fp = open(save_path, 'w')
     writer = csv.DictWriter(fp, results_keys)
     writer.writeheader()
@@ -430,7 +600,10 @@ def main():
                         help="don't delete temporary WSI data generated "
                              "(only relevant for training)")
     parser.add_argument("--nprocs", type=int, default=1,
-                        help="number of processes to run at once (only "
+                        help="number of processes to run at once")
+    parser.add_argument("--use_threads", action="store_true",
+                        help="run training workers as threads rather than "
+                             "processes, sharing a single process (only "
                              "relevant for training)")
     args = parser.parse_args()
 
@@ -455,6 +628,7 @@ def main():
     skip_alignment = bool(args.skip_alignment)
     keep_wsi_data = bool(args.keep_wsi_data)
     nprocs = args.nprocs
+    use_threads = bool(args.use_threads)
 
     if mode != "evaluate":
         print "doing training..."
@@ -491,37 +665,54 @@ def main():
             sys.exit(1)
 
         # create jobs to run
-        job_queue = Queue()
+        jobs = []
         fp_lemmas = open(lemmas_path)
-        lemmas = [line.strip() for line in fp_lemmas.xreadlines()]
+        lemmas = [line.strip() for line in fp_lemmas]
         fp_lemmas.close()
         if experiment == "default":
             for lem in lemmas:
-                job_queue.put((lem, None))
+                jobs.append((lem, None))
         else:
             model_num = 0
             bootstrap_size = args.bootstrap_size
             for _ in xrange(bootstrap_size):
                 for lem in lemmas:
-                    job_queue.put((lem, model_num))
+                    jobs.append((lem, model_num))
                     model_num += 1
-        for _ in xrange(nprocs):
-            job_queue.put("STOP")
-
-        # run procs to perform wsi
-        write_lock = Lock()
+        # load stopwords for each language once, to be shared by all procs
+        all_stopwords = {}
+        for lang in set(lem.split(".")[-1] for lem in lemmas):
+            all_stopwords[lang] = get_stopwords(lang, tools_dir)
+
+        # split jobs between procs up front (striding so each proc gets a
+        # similar mix of jobs), rather than dispatching them via a queue
+        job_shards = [jobs[i::nprocs] for i in xrange(nprocs)]
+
+        # run procs to perform wsi, with single process writing their logs
+        log_queue = Queue()
+        log_proc = Process(target=run_log_writer, args=(log_queue,))
+        log_proc.start()
         do_bootstrapping = (experiment == "bootstrapping")
+        # threads avoid forking a copy of each worker, and are enough when
+        # most time is spent waiting on the HDP/HCA executable
+        if use_threads:
+            worker_class = Thread
+        else:
+            worker_class = Process
         procs = []
-        for _ in xrange(nprocs):
-            p = Process(target=run_process_worker,
-                        args=(job_queue, results_dir, corpus_dir, wn_version,
-                              tools_dir, tm, tm_dir, wsi_options,
-                              do_bootstrapping, do_alignment,
-                              keep_wsi_data, write_lock))
+        for job_shard in job_shards:
+            p = worker_class(target=run_process_worker,
+                             args=(job_shard, results_dir, corpus_dir,
+                                   wn_version, tools_dir, tm, tm_dir,
+                                   wsi_options, do_bootstrapping,
+                                   do_alignment, keep_wsi_data, log_queue,
+                                   all_stopwords))
             p.start()
             procs.append(p)
         for p in procs:
             p.join()
+        log_queue.put(None)
+        log_proc.join()
         print "WSI processing done!"
         print ""
 
@@ -535,7 +726,7 @@ def main():
 
         gold_dist_file = args.gold_dist_file
         save_path = os.path.join(results_dir, "evaluation_results.csv")
-        evaluate_results(tm_output_dir, save_path, gold_dist_file)
+        evaluate_results(tm_output_dir, save_path, gold_dist_file, nprocs)
 
         print "evaluation done!"
         print ""
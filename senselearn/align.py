@@ -6,7 +6,8 @@ Provides class for aligning topic modelling output to sense inventory
 given sense glosses
 """
 
-from senselearn.probability import Distribution, js_divergence
+from senselearn.probability import Distribution, get_plogp_terms, \
+    plogp_js_divergence
 
 
 class TopicSenseAligner:
@@ -26,7 +27,14 @@ class TopicSenseAligner:
             corresponding to sense gloss (represented by dict)
         :return: None
         """
-        self.all_gloss_dists[lemma] = dic_sense_dist
+        # normalise (and compute p * log2(p) terms) once here, since the same
+        # gloss distributions are reused for every model trained on lemma
+        norm_gloss_dists = {}
+        for sense, gloss_dist in dic_sense_dist.iteritems():
+            norm_gloss_dist = Distribution.make_normalised_dist(gloss_dist)
+            norm_gloss_dists[sense] = (norm_gloss_dist,
+                                       get_plogp_terms(norm_gloss_dist))
+        self.all_gloss_dists[lemma] = norm_gloss_dists
 
     def do_alignment(self, topic_model, lemma):
         """
@@ -36,69 +44,76 @@ class TopicSenseAligner:
         :param lemma: lemma we are performing alignment for
         :return: sense distribution (represented by a Distribution)
         """
-        # make topic-word distributions
-        topic_word_dists = {}
-        for t, word_counts in topic_model["topic_word_counts"].iteritems():
-            topic_word_dists[t] = Distribution()
-            topic_word_dists[t].update(word_counts)
-            topic_word_dists[t].normalise_mutable()
-
-        # make doc-topic distributions
-        doc_topic_distributions = {}
-        for d, topic_counts in topic_model["doc_topic_counts"].iteritems():
-            doc_topic_distributions[d] = Distribution()
-            doc_topic_distributions[d].update(topic_counts)
-            doc_topic_distributions[d].normalise_mutable()
-
-        # get dict mapping sense to distribution over words
+        # get dict mapping sense to (normalised) distribution over words and
+        # its p * log2(p) terms
         gloss_dists = self.all_gloss_dists[lemma]
 
         # produce overall distribution over topics (hard-assignment)
-        topic_dist = self._produce_topic_dist_hard(doc_topic_distributions)
+        topic_dist = self._produce_topic_dist_hard(
+            topic_model["doc_topic_counts"])
 
         # finally, do prevalence-score based alignment
-        return self._prevalence_score_alignment(topic_dist, topic_word_dists,
-                                                gloss_dists)
+        return self._prevalence_score_alignment(
+            topic_dist, topic_model["topic_word_counts"], gloss_dists)
 
     @staticmethod
-    def _produce_topic_dist_hard(doc_dists):
+    def _produce_topic_dist_hard(doc_topic_counts):
         """
         produces distribution over topics based on document distributions over
         topics, based on hard assignment (one topic per document)
 
-        :param doc_dists: dict containing doc distributions over topics
+        :param doc_topic_counts: dict mapping doc id to topic counts (as a dict)
         :return: distribution over topics (represented by Distribution)
         """
-        # get un-normalised distribution over topics
+        # count documents assigned to each topic (normalising each document's
+        # counts first would not change its mode)
+        mode_counts = {}
+        for topic_counts in doc_topic_counts.itervalues():
+            # hard assignment (tie-breaking by choosing minimum topic)
+            max_count = max(topic_counts.itervalues())
+            mode_topic = min(t for t, c in topic_counts.iteritems()
+                             if c == max_count)
+            mode_counts[mode_topic] = mode_counts.get(mode_topic, 0.0) + 1.0
+
+        # get normalised distribution over topics
         result = Distribution()
-        for doc_distribution in doc_dists.values():
-            # hard assignment
-            mode_topic = doc_distribution.mode(min_tie_break=True)
-            result[mode_topic] += 1.0
+        result.update(mode_counts)
         result.normalise_mutable()
         return result
 
     @staticmethod
-    def _prevalence_score_alignment(topic_dist, topic_word_dists, gloss_dists):
+    def _prevalence_score_alignment(topic_dist, topic_word_counts,
+                                    gloss_dists):
         """
         performs the topic-sense alignment, and returns distribution over senses
 
         :param topic_dist: distribution over topics (based on hard assignment)
-        :param topic_word_dists: dict mapping topic id to topic distribution
-            over words
-        :param gloss_dists: dict mapping sense id to gloss distribution over
-            words
+        :param topic_word_counts: dict mapping topic id to topic word counts
+            (as a dict)
+        :param gloss_dists: dict mapping sense id to tuple of normalised gloss
+            distribution over words and its p * log2(p) terms
         :return: distribution over senses (represented by a Distribution)
         """
+        # normalise every topic's word counts once, straight into plain
+        # dicts (rather than once per sense/topic combination)
+        norm_topic_dists = {}
+        for topic, word_counts in topic_word_counts.iteritems():
+            total_count = float(sum(word_counts.itervalues()))
+            norm_topic_dist = dict(
+                (w, c / total_count) for w, c in word_counts.iteritems())
+            norm_topic_dists[topic] = (norm_topic_dist,
+                                       get_plogp_terms(norm_topic_dist))
+
         # iterate over every combination of sense/topic to calculate
         # un-normalised distribution
         ws_dist = Distribution()
-        for topic, topic_dist_over_words in topic_word_dists.iteritems():
+        for topic, (topic_word_dist, topic_plogp) in \
+                norm_topic_dists.iteritems():
             topic_prob = topic_dist[topic]
-            for sense, sense_dist_over_words in gloss_dists.iteritems():
+            for sense, (gloss_dist, gloss_plogp) in gloss_dists.iteritems():
                 # obtain js-divergence between distributions
-                jsd = js_divergence(sense_dist_over_words,
-                                    topic_dist_over_words)
+                jsd = plogp_js_divergence(gloss_dist, gloss_plogp,
+                                          topic_word_dist, topic_plogp)
                 ws_dist[sense] += (1 - jsd) * topic_prob
 
         if sum(ws_dist.values()) < 0.00001:
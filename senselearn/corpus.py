@@ -7,12 +7,103 @@ be used to help create WSI output, and map vocab ID's to strings
 """
 
 import os
-from copy import copy
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import count
+from multiprocessing import Pool
+
+# functions working under both Python 2 and 3
+try:
+    from itertools import izip
+except ImportError:
+    izip = zip
+try:
+    iteritems = dict.iteritems
+except AttributeError:
+    iteritems = dict.items
+try:
+    from sys import intern
+except ImportError:
+    pass
 
 MIN_WORD_LEN = 3
 VOCAB_FREQ_THRESHOLD = 10
 CONTEXT_WINDOW_SIZE = 3
 
+# suffixes of positional context words, indexed by distance from target word
+LEFT_CONTEXT_SUFFIXES = ["_#%d" % -i for i in range(CONTEXT_WINDOW_SIZE + 1)]
+RIGHT_CONTEXT_SUFFIXES = ["_#%d" % i for i in range(CONTEXT_WINDOW_SIZE + 1)]
+
+
+def parse_lemma_usages(lemma, usages_dir, stopwords):
+    """
+    parse usages file for given lemma into document BOWs; this works
+    independently of any corpus object, so that several lemmas can be
+    parsed in parallel
+
+    :param lemma: lemma to obtain usages for
+    :param usages_dir: directory containing lemma usage files
+    :param stopwords: set of stopwords
+    :return: list of BOWs (Counters of word strings), one per usage
+    """
+    target_word = lemma.split(".")[0]
+    usages_path = os.path.join(usages_dir, lemma + ".txt")
+    doc_bows = []
+
+    # words are interned, so that each distinct word is stored once no
+    # matter how many documents it occurs in
+    with open(usages_path, 'r') as usages_fp:
+        for line in usages_fp:
+            tokens = line.split()
+            target_word_loc = int(tokens.pop(0))
+            # follow identical procedure as used by Lau et al.: keep
+            # positions of tokens passing the length and stopword filter
+            kept = [i for i, t in enumerate(tokens)
+                    if len(t) >= MIN_WORD_LEN and t not in stopwords]
+            # number of kept tokens preceding the target word
+            target_word_i = bisect_left(kept, target_word_loc)
+            # words preceded by a "#" token are merged with it
+            line_array = [
+                intern("#" + tokens[i])
+                if i > 0 and tokens[i - 1] == "#" and
+                tokens[i] != target_word
+                else intern(tokens[i])
+                for i in kept]
+
+            # all words in this usage (including positional tokens)
+            doc_words = line_array[:]
+
+            # add positional word tokens
+            for i in range(1, CONTEXT_WINDOW_SIZE + 1):
+                if (target_word_i - i) >= 0:
+                    # left context word
+                    t = line_array[target_word_i - i]
+                    if t.count("#") != 2:
+                        doc_words.append(
+                            intern(t + LEFT_CONTEXT_SUFFIXES[i]))
+                if (target_word_i + i) < len(line_array):
+                    # right context word
+                    t = line_array[target_word_i + i]
+                    if t.count("#") != 2:
+                        doc_words.append(
+                            intern(t + RIGHT_CONTEXT_SUFFIXES[i]))
+
+            # usages without any words are not added as documents
+            if doc_words:
+                doc_bows.append(Counter(doc_words))
+    return doc_bows
+
+
+def parse_lemma_usages_star(args):
+    """
+    unpacks arguments for parse_lemma_usages, for use with Pool.imap
+
+    :param args: tuple of (lemma, usages_dir, stopwords)
+    :return: list of BOWs, as returned by parse_lemma_usages
+    """
+    return parse_lemma_usages(*args)
+
 
 class DefaultCorpus:
     """
@@ -24,15 +115,20 @@ class DefaultCorpus:
         :param usages_dir: directory containing lemma usage files
         :param stopwords: set of stopwords
         """
-        self.word_counts = {}
+        self.word_counts = Counter()
 
         # bow representations of documents, based on raw word strings
         self.doc_bows = []
         self.num_docs = 0
 
-        # mappings from lemmas to docs, and vice versa
+        # mappings from lemmas to docs (as int arrays), and vice versa (with
+        # lemma of each doc stored as lemma index in lemma_list)
         self.lemma_docs = {}
-        self.doc_lemmas = []
+        # immutable copies of lemma doc arrays, made as they are requested
+        self.lemma_doc_tuples = {}
+        self.doc_lemmas = array("i")
+        self.lemma_list = []
+        self.lemma_indices = {}
 
         # vocab bow representation of documents, where words are represented
         # by their ID in vocabulary, along with mapping from word-id to word
@@ -49,7 +145,7 @@ class DefaultCorpus:
 
         # list of all available lemmas in corpus (not necessarily all scanned
         # into this object)
-        self.all_lemmas = lemmas
+        self.all_lemmas = tuple(lemmas)
 
         self.stopwords = set()
         for w in stopwords:
@@ -63,49 +159,46 @@ class DefaultCorpus:
         :param lemma: lemma to obtain usages for
         :return: None
         """
-        target_word = lemma.split(".")[0]
-        usages_path = os.path.join(self.corpus_dir, lemma + ".txt")
-        usages_fp = open(usages_path, 'r')
-
-        for doc_num, line in enumerate(usages_fp.xreadlines()):
-            line_array = []
-            target_word_loc = int(line.split()[0])
-            target_word_i = None
-            tokens = line.split()[1:]
-            # scan through tokens in line
-            for i in range(len(tokens)):
-                if i == target_word_loc:
-                    target_word_i = len(line_array)
-                t = tokens[i]
-                # follow identical procedure as used by Lau et al.
-                if (len(t) >= MIN_WORD_LEN) and (t not in self.stopwords):
-                    if (i > 0) and (tokens[i-1] == "#") and t != target_word:
-                        t = tokens[i - 1] + t
-                    line_array.append(t)
-                    self._add_word(lemma, doc_num, t)
+        add_doc = self._add_doc
+        for bow in parse_lemma_usages(lemma, self.corpus_dir, self.stopwords):
+            add_doc(lemma, bow)
 
-            # add positional word tokens
-            for i in range(1, CONTEXT_WINDOW_SIZE + 1):
-                if (target_word_i - i) >= 0:
-                    # left context word
-                    t = line_array[target_word_i - i]
-                    if t.count("#") != 2:
-                        self._add_word(lemma, doc_num, "%s_#%d" % (t, -i))
-                if (target_word_i + i) < len(line_array):
-                    # right context word
-                    t = line_array[target_word_i + i]
-                    if t.count("#") != 2:
-                        self._add_word(lemma, doc_num, "%s_#%d" % (t, i))
+    def scan_lemmas(self, lemmas, nprocs=1):
+        """
+        parse usages files for several lemmas, and populate this corpus;
+        usages files are parsed by a pool of worker processes, and merged
+        into this corpus in the order the lemmas are given
+
+        :param lemmas: lemmas to obtain usages for
+        :param nprocs: number of worker processes to parse usages files with
+        :return: None
+        """
+        if nprocs <= 1 or len(lemmas) <= 1:
+            for lemma in lemmas:
+                self.scan_lemma_usages(lemma)
+            return
 
-        usages_fp.close()
+        add_doc = self._add_doc
+        pool = Pool(min(nprocs, len(lemmas)))
+        try:
+            # imap (rather than imap_unordered) keeps doc ID's deterministic
+            args = [(lemma, self.corpus_dir, self.stopwords)
+                    for lemma in lemmas]
+            for lemma, doc_bows in izip(
+                    lemmas, pool.imap(parse_lemma_usages_star, args)):
+                for bow in doc_bows:
+                    add_doc(lemma, bow)
+        finally:
+            pool.close()
+            pool.join()
 
     def get_available_lemmas(self):
         """
         obtain all available lemmas in corpus
 
-        :return: list of lemmas
+        :return: tuple of lemmas
         """
-        return copy(self.all_lemmas)
+        return self.all_lemmas
 
     def get_num_usages(self):
         """
@@ -126,12 +219,17 @@ class DefaultCorpus:
 
     def get_doc_ids_by_lemma(self, lemma):
         """
-        obtain list of all doc ID's which are usages of given lemma
+        obtain all doc ID's which are usages of given lemma
 
         :param lemma: lemma to obtain usages ID's of
-        :return: list of usage ID's
+        :return: tuple of usage ID's
         """
-        return copy(self.lemma_docs[lemma])
+        try:
+            return self.lemma_doc_tuples[lemma]
+        except KeyError:
+            doc_ids = tuple(self.lemma_docs[lemma])
+            self.lemma_doc_tuples[lemma] = doc_ids
+            return doc_ids
 
     def doc_id_to_lemma(self, doc_id):
         """
@@ -141,7 +239,7 @@ class DefaultCorpus:
         :return: corresponding lemma (or None if usage ID is invalid)
         """
         try:
-            return self.doc_lemmas[doc_id]
+            return self.lemma_list[self.doc_lemmas[doc_id]]
         except IndexError:
             return None
 
@@ -175,77 +273,51 @@ class DefaultCorpus:
 
         :return: None
         """
-        # re-set vocab fields to empty in-case they have been changed
-        self.vocab_list = []
-        self.vocab_size = 0
-        self.vocab_dict = {}
-        vocab_id = 0
-
         # scan through global count dictionary to enumerate vocabulary
+        # (only including vocabulary above frequency threshold)
         # Note: first vocab item is at index 0 in array, but has id 1
-        for word, freq in self.word_counts.iteritems():
-            # only include vocabulary above frequency threshold
-            if freq < self.min_vocab_freq:
-                continue
-            self.vocab_list.append(word)
-            self.vocab_size += 1
-            self.vocab_dict[word] = vocab_id
-            vocab_id += 1
+        min_vocab_freq = self.min_vocab_freq
+        self.vocab_list = [word for word, freq in iteritems(self.word_counts)
+                           if freq >= min_vocab_freq]
+        self.vocab_size = len(self.vocab_list)
+        self.vocab_dict = dict(izip(self.vocab_list, count()))
 
         # build vocab BOWs
-        self.vocab_bows = [None] * self.num_docs
-        for doc, bow in enumerate(self.doc_bows):
-            self.vocab_bows[doc] = {}
-            vocab_bow = self.vocab_bows[doc]
-            for word, count in bow.iteritems():
-                word_id = self.word_to_id(word)
-                if word_id is not None:
-                    vocab_bow[word_id] = count
+        vocab_dict = self.vocab_dict
+        self.vocab_bows = [
+            dict((vocab_dict[word], word_count)
+                 for word, word_count in iteritems(bow) if word in vocab_dict)
+            for bow in self.doc_bows]
         # now up to date
         self.vocab_up_to_date = True
 
-    def _add_word(self, lemma, lemma_usage_num, word):
+    def _add_doc(self, lemma, bow):
         """
-        adds word to corpus for given usage of given lemma
+        adds new usage of given lemma to corpus
 
         :param lemma: corresponding lemma
-        :param lemma_usage_num: corresponding usage number of lemma
-        :param word: word to add
+        :param bow: Counter of all words in usage
         :return: None
         """
         self.vocab_up_to_date = False
 
-        # obtain list of doc_ids for this lemma
-        try:
-            lemma_docs = self.lemma_docs[lemma]
-        except KeyError:
-            self.lemma_docs[lemma] = []
-            lemma_docs = self.lemma_docs[lemma]
-
-        # obtain bow for this document, creating new one if needed
-        if lemma_usage_num >= len(lemma_docs):
-            # means new bag of words needed, update all relevant fields
-            doc_num = self.num_docs
-            lemma_docs.append(doc_num)
-            self.doc_lemmas.append(lemma)
-            self.num_docs += 1
-            bow = {}
-            self.doc_bows.append(bow)
-        else:
-            doc_num = lemma_docs[lemma_usage_num]
-            bow = self.doc_bows[doc_num]
-
-        # add word to bow
-        try:
-            bow[word] += 1
-        except KeyError:
-            bow[word] = 1
+        # fold the document's word counts into the global word counts
+        self.word_counts.update(bow)
 
-        # update global word counts
+        # update all document-related fields
+        doc_num = self.num_docs
         try:
-            self.word_counts[word] += 1
+            lemma_index = self.lemma_indices[lemma]
         except KeyError:
-            self.word_counts[word] = 1
+            lemma_index = len(self.lemma_list)
+            self.lemma_list.append(lemma)
+            self.lemma_indices[lemma] = lemma_index
+            self.lemma_docs[lemma] = array("i")
+        self.lemma_docs[lemma].append(doc_num)
+        self.lemma_doc_tuples.pop(lemma, None)
+        self.doc_lemmas.append(lemma_index)
+        self.num_docs += 1
+        self.doc_bows.append(bow)
 
     def __iter__(self):
         """
@@ -257,22 +329,5 @@ class DefaultCorpus:
         # protect from race condition
         if not self.vocab_up_to_date:
             self.prepare_vocab()
-        return UsageCorpusIterator(self.vocab_bows)
+        return iter(self.vocab_bows)
 
-
-class UsageCorpusIterator:
-    """
-    Iterator class; used to iterate over the documents in
-    a corpus instance
-    """
-    def __init__(self, vocab_bows):
-        self.vocab_bows = vocab_bows
-        self.i = 0
-
-    def next(self):
-        try:
-            doc = self.i
-            self.i += 1
-            return self.vocab_bows[doc]
-        except IndexError:
-            raise StopIteration
@@ -7,6 +7,20 @@ Provides classes and functions implementing probability-related calculations
 
 from collections import defaultdict
 from math import log
+from operator import itemgetter
+
+# dict iteration functions working under both Python 2 and 3
+try:
+    iteritems = dict.iteritems
+    itervalues = dict.itervalues
+except AttributeError:
+    iteritems = dict.items
+    itervalues = dict.values
+
+# natural log of 2, for converting natural logs to base 2 (math.log(x, 2)
+# takes two logs per call, so divergences are summed in natural logs and
+# converted once at the end)
+LOG_2 = log(2)
 
 
 def js_divergence(dist1, dist2):
@@ -19,9 +33,93 @@ def js_divergence(dist1, dist2):
     """
     d1 = Distribution.make_normalised_dist(dist1)
     d2 = Distribution.make_normalised_dist(dist2)
-    dist_avg = (d1 + d2) / 2
-    return 0.5 * (kl_divergence(d1, dist_avg)
-                  + kl_divergence(d2, dist_avg))
+    return normalised_js_divergence(d1, d2)
+
+
+def normalised_js_divergence(dist1, dist2):
+    """
+    Calculates JS-divergence between 2 already normalised distributions
+    (does not re-normalise inputs, or build average distribution)
+
+    :param dist1: first normalised distribution (of type dict or Distribution)
+    :param dist2: second normalised distribution (of type dict or
+        Distribution)
+    :return: JS divergence
+    """
+    # if either distribution is empty, the (re-normalised) average is just
+    # the other distribution, so there is no divergence
+    if not dist1 or not dist2:
+        return 0.0
+
+    # KL-divergence of each distribution from their average, where average
+    # probabilities are computed as needed
+    dist1_get = dist1.get
+    dist2_get = dist2.get
+    kld1 = 0.0
+    for k, v1 in iteritems(dist1):
+        # skip elements with value zero (they do not contribute)
+        if v1 > 0.0:
+            v_avg = (v1 + dist2_get(k, 0.0)) / 2
+            kld1 += v1 * log(v1 / v_avg)
+    kld2 = 0.0
+    for k, v2 in iteritems(dist2):
+        if v2 > 0.0:
+            v_avg = (dist1_get(k, 0.0) + v2) / 2
+            kld2 += v2 * log(v2 / v_avg)
+    return 0.5 * (kld1 + kld2) / LOG_2
+
+
+def get_plogp_terms(dist):
+    """
+    Calculates p * log2(p) term for each non-zero element of a normalised
+    distribution (for use with plogp_js_divergence)
+
+    :param dist: normalised distribution (of type dict or Distribution)
+    :return: dict mapping each element with non-zero probability to its
+        p * log2(p) term
+    """
+    return dict((k, p * log(p) / LOG_2)
+                for k, p in iteritems(dist) if p > 0.0)
+
+
+def plogp_js_divergence(dist1, plogp1, dist2, plogp2):
+    """
+    Calculates JS-divergence between 2 already normalised distributions,
+    given their precomputed p * log2(p) terms (from get_plogp_terms), so that
+    only one log is needed per element the distributions have in common
+
+    Elements in only one of the distributions contribute exactly their
+    probability to the (doubled) divergence, so only common elements need
+    to be visited
+
+    :param dist1: first normalised distribution (of type dict or Distribution)
+    :param plogp1: p * log2(p) terms of first distribution
+    :param dist2: second normalised distribution (of type dict or
+        Distribution)
+    :param plogp2: p * log2(p) terms of second distribution
+    :return: JS divergence
+    """
+    # if either distribution is empty, there is no divergence (consistent
+    # with normalised_js_divergence)
+    if not plogp1 or not plogp2:
+        return 0.0
+
+    # visit common elements by iterating over smaller distribution
+    if len(plogp1) > len(plogp2):
+        dist1, plogp1, dist2, plogp2 = dist2, plogp2, dist1, plogp1
+    plogp2_get = plogp2.get
+    common_mass = 0.0
+    common_plogp = 0.0
+    common_mlogm = 0.0
+    for k, plogp in iteritems(plogp1):
+        plogp_other = plogp2_get(k)
+        if plogp_other is not None:
+            mass = dist1[k] + dist2[k]
+            common_mass += mass
+            common_plogp += plogp + plogp_other
+            # (natural log, converted to base 2 below)
+            common_mlogm += mass * log(mass / 2)
+    return 0.5 * (2.0 - common_mass + common_plogp - common_mlogm / LOG_2)
 
 
 def kl_divergence(dist1, dist2):
@@ -34,13 +132,13 @@ def kl_divergence(dist1, dist2):
     """
     d1 = Distribution.make_normalised_dist(dist1)
     d2 = Distribution.make_normalised_dist(dist2)
-    kld = 0
-    for k, v1 in d1.iteritems():
+    kld = 0.0
+    for k, v1 in iteritems(d1):
         # skip elements with value zero (they do not contribute)
         if v1 > 0.0:
-            v2 = d2[k]
-            kld += v1 * log((v1 / v2), 2)
-    return kld
+            v2 = d2.get(k, 0.0)
+            kld += v1 * log(v1 / v2)
+    return kld / LOG_2
 
 
 def average_distributions(distribution_list):
@@ -51,10 +149,15 @@ def average_distributions(distribution_list):
         each is of type Distribution
     :return: average distribution (of type Distribution)
     """
-    sum_dists = Distribution()
+    # accumulate all probabilities in one dict, rather than building a new
+    # Distribution for each addition
+    sum_probs = defaultdict(float)
     for distribution in distribution_list:
         assert isinstance(distribution, Distribution)
-        sum_dists += distribution.normalise_immutable()
+        for key, prob in iteritems(distribution.normalise_immutable()):
+            sum_probs[key] += prob
+    sum_dists = Distribution()
+    dict.update(sum_dists, sum_probs)
     sum_dists.normalise_mutable()
     return sum_dists
 
@@ -62,6 +165,9 @@ def average_distributions(distribution_list):
 class Distribution(defaultdict):
     """
     Class representing a probability distribution
+
+    Note: internally, new Distributions are filled using dict.update (which
+    bypasses __setitem__, so is_normalised must be set explicitly)
     """
     def __init__(self):
         defaultdict.__init__(self, float)
@@ -80,10 +186,10 @@ class Distribution(defaultdict):
         :param other: other distribution to be added to this one
         """
         result = Distribution()
-        for key, prob in self.iteritems():
-            result[key] += prob
-        for key, prob in other.iteritems():
-            result[key] += prob
+        dict.update(result, self)
+        result_get = result.get
+        dict.update(result, ((key, result_get(key, 0.0) + prob)
+                             for key, prob in iteritems(other)))
         return result
 
     def __mul__(self, other):
@@ -91,26 +197,29 @@ class Distribution(defaultdict):
         :param other: scalar to multiple distribution by
         """
         result = Distribution()
-        for key, prob in self.iteritems():
-            result[key] = prob * other
+        dict.update(result, ((key, prob * other)
+                             for key, prob in iteritems(self)))
         return result
 
-    def __div__(self, other):
+    def __truediv__(self, other):
         """
         :param other: scalar to divide distribution by
         """
         result = Distribution()
         denominator = float(other)
-        for key, prob in self.iteritems():
-            result[key] = prob / denominator
+        dict.update(result, ((key, prob / denominator)
+                             for key, prob in iteritems(self)))
         return result
 
+    # Python 2 division operator
+    __div__ = __truediv__
+
     def __str__(self):
         print_str = ""
         if not self.keys():
             return print_str
-        max_key_len = max(len(str(k)) for k in self.iterkeys())
-        for k, prob in sorted(self.iteritems()):
+        max_key_len = max(len(str(k)) for k in self)
+        for k, prob in sorted(iteritems(self)):
             if max_key_len > 0:
                 print_str += ("%" + str(max_key_len) + "s: ") % k
             else:
@@ -123,20 +232,18 @@ class Distribution(defaultdict):
         normalises distribution, so that probs add up to one
         returns new distribution with normalised values
 
-        immutable version (returns a new Distribution, does not alter
-        input one)
+        immutable version (does not alter input one, and returns a new
+        Distribution unless this one is already normalised, in which case
+        self is returned and should not be modified)
 
         :return: normalised distribution
         """
         if self.is_normalised:
-            # if already normalised, just make simple copy of self
-            new_dist = Distribution()
-            for key, prob in self.iteritems():
-                new_dist[key] = prob
-        else:
-            values_sum = float(sum(self.values()))
-            new_dist = self / values_sum
+            # if already normalised, no need to copy
+            return self
 
+        values_sum = float(sum(self.values()))
+        new_dist = self / values_sum
         new_dist.is_normalised = True
         return new_dist
 
@@ -154,8 +261,8 @@ class Distribution(defaultdict):
             return
         else:
             values_sum = float(sum(self.values()))
-            for key, prob in self.iteritems():
-                self[key] = prob / values_sum
+            dict.update(self, [(key, prob / values_sum)
+                               for key, prob in iteritems(self)])
             self.is_normalised = True
 
     def mode(self, min_tie_break=False):
@@ -167,9 +274,13 @@ class Distribution(defaultdict):
         :return: the mode (key with greatest probability)
         """
         if min_tie_break:
-            return max(sorted(self.keys()), key=self.get)
+            # find greatest probability, then minimum key with it (rather
+            # than sorting all keys)
+            max_prob = max(itervalues(self))
+            return min(key for key, prob in iteritems(self)
+                       if prob == max_prob)
         else:
-            return max(self.keys(), key=self.get)
+            return max(iteritems(self), key=itemgetter(1))[0]
 
     def get_entropy(self):
         """
@@ -179,7 +290,7 @@ class Distribution(defaultdict):
         """
         if not self.is_normalised:
             self.normalise_mutable()
-        return -sum(p * log(p, 2) for p in self.itervalues() if p > 0.0)
+        return -sum(p * log(p, 2) for p in itervalues(self) if p > 0.0)
 
     def exponential_rescale(self, k):
         """
@@ -189,13 +300,10 @@ class Distribution(defaultdict):
         :param k: exponential rescaling parameter
         :return: rescaled Distribution
         """
-        prob_sum = float(sum(self.values()))
+        prob_sum = float(sum(itervalues(self)))
         new_dist = Distribution()
-        for key, prob in self.iteritems():
-            if prob > 0.0:
-                new_dist[key] = (prob / prob_sum) ** k
-            else:
-                new_dist[key] = 0.0
+        dict.update(new_dist, ((key, (prob / prob_sum) ** k if prob > 0.0
+                                else 0.0) for key, prob in iteritems(self)))
         new_dist.normalise_mutable()
         return new_dist
 
@@ -203,7 +311,8 @@ class Distribution(defaultdict):
     def make_normalised_dist(d):
         """
         create normalised Distribution from input which can be either a
-        Distribution or a dictionary
+        Distribution or a dictionary (an already normalised Distribution is
+        returned as is, so result should not be modified)
 
         :param d: dict or Distribution to create normalised Distribution from
         :return: normalised Distribution
@@ -5,13 +5,26 @@ Last updated: July, 2016
 Provides functions for obtaining WordNet gloss distributions
 """
 
+import hashlib
 import os
+import pickle
 import subprocess
 import re
+from itertools import chain
 
 from senselearn.errors import ExperimentFail
 from senselearn.probability import Distribution
 
+# directory for caching gloss distributions on disk (they only depend on
+# lemma, WordNet version, stopwords and NLP tools used)
+GLOSS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                               "senselearn", "gloss")
+
+# separator line between WordNet outputs of different lemmas when processing
+# them in a batch (a single lowercase word, so it passes through the
+# tokenizer, POS tagger and lemmatizer unchanged apart from its tag)
+BATCH_SEPARATOR = "lexsemtmbatchseparator"
+
 POS_MAP = {
     "n": "noun",
     "v": "verb",
@@ -19,6 +32,15 @@ POS_MAP = {
     "r": "adv",
 }
 
+# punctuation stripped from ends of gloss words
+EDGE_PUNCT = "\"')("
+
+# patterns matching (tag-stripped) line of WordNet output starting senses
+# list, for each POS
+START_PATTERNS = dict(
+    (pos, re.compile("^the %s .* have [0-9]+ sens.*" % pos_name))
+    for pos, pos_name in POS_MAP.iteritems())
+
 
 def is_int(s):
     """
@@ -34,10 +56,78 @@ def is_int(s):
         return False
 
 
+def get_gloss_cache_path(lemma, wn_version, stopwords, tools_dir):
+    """
+    Obtain path of disk cache file for gloss distributions of given lemma
+
+    :param lemma: lemma of gloss distributions
+    :param wn_version: version of WordNet used
+    :param stopwords: set of stopwords used
+    :param tools_dir: directory containing NLP tools used
+    :return: path of cache file
+    """
+    key = "%s|%s|%s|%s" % (lemma, wn_version, os.path.abspath(tools_dir),
+                           "|".join(sorted(stopwords)))
+    return os.path.join(GLOSS_CACHE_DIR,
+                        hashlib.sha1(key).hexdigest() + ".pkl")
+
+
+def load_cached_gloss_dists(cache_path):
+    """
+    Load gloss distributions from disk cache file
+
+    :param cache_path: path of cache file
+    :return: dist mapping sense ID to gloss distribution over words (or None
+        if there is no usable cache file)
+    """
+    try:
+        with open(cache_path, "rb") as fp:
+            cached_dists = pickle.load(fp)
+    except Exception:
+        # missing or unreadable (e.g. truncated) cache file is a cache miss
+        return None
+    # Distributions are cached as plain dicts (since Distribution cannot be
+    # unpickled)
+    sense_gloss_dists = {}
+    for sense_name, cached_dist in cached_dists.iteritems():
+        gloss_dist = Distribution()
+        dict.update(gloss_dist, cached_dist)
+        sense_gloss_dists[sense_name] = gloss_dist
+    return sense_gloss_dists
+
+
+def save_cached_gloss_dists(sense_gloss_dists, cache_path):
+    """
+    Save gloss distributions to disk cache file (written to temporary file
+    first and renamed, so that other processes never see partial file)
+
+    :param sense_gloss_dists: dist mapping sense ID to gloss distribution
+        over words
+    :param cache_path: path of cache file
+    :return: None
+    """
+    cached_dists = dict((sense_name, dict(gloss_dist)) for sense_name,
+                        gloss_dist in sense_gloss_dists.iteritems())
+    tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    try:
+        if not os.path.exists(GLOSS_CACHE_DIR):
+            os.makedirs(GLOSS_CACHE_DIR)
+        with open(tmp_path, "wb") as fp:
+            pickle.dump(cached_dists, fp, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, cache_path)
+    except Exception:
+        # data is only a cache, so carry on if it cannot be saved (without
+        # leaving partial temporary file behind)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
 def get_wordnet_gloss_dists(lemma, wn_version, stopwords, tools_dir):
     """
     Obtain gloss distributions for given lemma (general function for all
-    languages)
+    languages), using disk cache if available
 
     :param lemma: lemma to obtain gloss distributions for
     :param wn_version: version of WordNet to use (should be name of WordNet
@@ -47,31 +137,71 @@ def get_wordnet_gloss_dists(lemma, wn_version, stopwords, tools_dir):
     :return: dist mapping sense ID to gloss distribution over words
         (each represented by a Distribution)
     """
+    cache_path = get_gloss_cache_path(lemma, wn_version, stopwords,
+                                      tools_dir)
+    sense_gloss_dists = load_cached_gloss_dists(cache_path)
+    if sense_gloss_dists is not None:
+        return sense_gloss_dists
+
     lang = lemma.split(".")[-1]
     if lang == "en":
-        return get_en_gloss_dists(lemma, wn_version, stopwords, tools_dir)
+        sense_gloss_dists = get_en_gloss_dists(lemma, wn_version, stopwords,
+                                               tools_dir)
     else:
         raise ExperimentFail("language %s not implemented" % lang)
+    save_cached_gloss_dists(sense_gloss_dists, cache_path)
+    return sense_gloss_dists
 
 
-def get_en_gloss_dists(lemma, wn_version, stopwords, tools_dir):
+def get_wordnet_gloss_dists_batch(lemmas, wn_version, stopwords, tools_dir):
     """
-    Obtain English sense gloss distributions based on Princeton Wordnet
+    Obtain gloss distributions for several lemmas at once (general function
+    for all languages), so that NLP tools only need to be started once for
+    all lemmas not in disk cache
 
-    :param lemma: lemma to obtain gloss distributions for
+    :param lemmas: list of lemmas to obtain gloss distributions for
     :param wn_version: version of WordNet to use (should be name of WordNet
         executable)
-    :param stopwords: set of stopwords
+    :param stopwords: dict mapping language code to set of stopwords
     :param tools_dir: directory containing NLP tools
-    :return: dist mapping sense ID to gloss distribution over words
-        (each represented by a Distribution)
+    :return: dict mapping lemma to its gloss distributions (as returned by
+        get_wordnet_gloss_dists), for lemmas whose gloss distributions could
+        be obtained (other lemmas should be tried with
+        get_wordnet_gloss_dists, to obtain the error for them)
     """
-    pos = lemma.split(".")[-2]
-    lemma_base = ".".join(lemma.split(".")[:-2])
+    all_gloss_dists = {}
+    en_lemmas = []
+    for lemma in lemmas:
+        lang = lemma.split(".")[-1]
+        if lang not in stopwords:
+            continue
+        cache_path = get_gloss_cache_path(lemma, wn_version, stopwords[lang],
+                                          tools_dir)
+        sense_gloss_dists = load_cached_gloss_dists(cache_path)
+        if sense_gloss_dists is not None:
+            all_gloss_dists[lemma] = sense_gloss_dists
+        elif lang == "en":
+            en_lemmas.append(lemma)
 
-    wn = os.path.join(tools_dir, "wn_bin", wn_version)
-    if not os.path.exists(wn):
-        raise ExperimentFail("wordnet path empty (%s)" % wn)
+    if en_lemmas:
+        en_gloss_dists = get_en_gloss_dists_batch(
+            en_lemmas, wn_version, stopwords["en"], tools_dir)
+        for lemma, sense_gloss_dists in en_gloss_dists.iteritems():
+            cache_path = get_gloss_cache_path(lemma, wn_version,
+                                              stopwords["en"], tools_dir)
+            save_cached_gloss_dists(sense_gloss_dists, cache_path)
+            all_gloss_dists[lemma] = sense_gloss_dists
+    return all_gloss_dists
+
+
+def get_en_gloss_pipeline_command(tools_dir):
+    """
+    Obtain shell command for tokenizing, POS tagging and lemmatizing WordNet
+    output (reading from stdin)
+
+    :param tools_dir: directory containing NLP tools
+    :return: shell command (as a string)
+    """
     open_nlp = os.path.join(tools_dir, "opennlp-tools-1.5.0", "bin", "opennlp")
     morpha = os.path.join(tools_dir, "morpha", "morpha")
     tokenizer_model = os.path.join(tools_dir, "opennlp-tools-1.5.0",
@@ -82,25 +212,128 @@ def get_en_gloss_dists(lemma, wn_version, stopwords, tools_dir):
     morpha_post_correct = os.path.join(tools_dir, "morpha",
                                        "morph-post-correct.prl")
 
-    command = """%s "%s" -over""" % (wn, lemma_base)
-    command += " | %s TokenizerME %s 2> /dev/null" % (open_nlp, tokenizer_model)
+    command = "%s TokenizerME %s 2> /dev/null" % (open_nlp, tokenizer_model)
     command += " | %s POSTagger %s 2> /dev/null" % (open_nlp, pos_tag_model)
     command += " | %s -tf %s" % (morpha, morpha_verb_stems)
     command += " | %s" % morpha_post_correct
+    return command
+
+
+def get_en_gloss_dists(lemma, wn_version, stopwords, tools_dir):
+    """
+    Obtain English sense gloss distributions based on Princeton Wordnet
+
+    :param lemma: lemma to obtain gloss distributions for
+    :param wn_version: version of WordNet to use (should be name of WordNet
+        executable)
+    :param stopwords: set of stopwords
+    :param tools_dir: directory containing NLP tools
+    :return: dist mapping sense ID to gloss distribution over words
+        (each represented by a Distribution)
+    """
+    lemma_base = ".".join(lemma.split(".")[:-2])
+
+    wn = os.path.join(tools_dir, "wn_bin", wn_version)
+    if not os.path.exists(wn):
+        raise ExperimentFail("wordnet path empty (%s)" % wn)
+
+    command = """%s "%s" -over""" % (wn, lemma_base)
+    command += " | %s" % get_en_gloss_pipeline_command(tools_dir)
     p = subprocess.Popen(command, stdout=subprocess.PIPE,
-                         shell=True, executable='/bin/bash')
+                         shell=True, executable='/bin/bash', close_fds=True)
+
+    # process gloss input to produce distribution, parsing lines as they
+    # are output (skipping to first non-empty line to check there is output)
+    stdout_lines = iter(p.stdout.readline, "")
+    for first_line in stdout_lines:
+        if first_line.strip():
+            break
+    else:
+        p.stdout.close()
+        p.wait()
+        raise ExperimentFail("Error in running wordnet!")
+    sense_gloss_dists = parse_en_gloss_lines(
+        chain([first_line], stdout_lines), lemma, stopwords)
+    p.stdout.close()
+    p.wait()
+    return sense_gloss_dists
+
+
+def get_en_gloss_dists_batch(lemmas, wn_version, stopwords, tools_dir):
+    """
+    Obtain English sense gloss distributions based on Princeton Wordnet for
+    several lemmas, running WordNet output for all lemmas through a single
+    tokenizer / POS tagger / lemmatizer pipeline (rather than starting the
+    tools, including two JVMs, once per lemma)
+
+    :param lemmas: list of lemmas to obtain gloss distributions for
+    :param wn_version: version of WordNet to use (should be name of WordNet
+        executable)
+    :param stopwords: set of stopwords
+    :param tools_dir: directory containing NLP tools
+    :return: dict mapping lemma to dict mapping sense ID to gloss distribution
+        over words (only for lemmas with non-empty WordNet output)
+    """
+    wn = os.path.join(tools_dir, "wn_bin", wn_version)
+    if not os.path.exists(wn):
+        raise ExperimentFail("wordnet path empty (%s)" % wn)
+
+    # obtain WordNet output for each lemma, separated by separator lines
+    wn_outputs = []
+    for lemma in lemmas:
+        lemma_base = ".".join(lemma.split(".")[:-2])
+        p = subprocess.Popen([wn, lemma_base, "-over"],
+                             stdout=subprocess.PIPE, close_fds=True)
+        wn_outputs.append(p.communicate()[0].strip())
+    batch_input = ("\n%s\n" % BATCH_SEPARATOR).join(wn_outputs) + "\n"
+
+    # run all WordNet output through pipeline at once, and split it back up
+    p = subprocess.Popen(get_en_gloss_pipeline_command(tools_dir),
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         shell=True, executable='/bin/bash', close_fds=True)
+    batch_out = p.communicate(batch_input)[0]
+    all_lines = [[]]
+    for line in batch_out.split("\n"):
+        if BATCH_SEPARATOR in line.lower():
+            all_lines.append([])
+        else:
+            all_lines[-1].append(line)
+    if len(all_lines) != len(lemmas):
+        raise ExperimentFail("Error in running gloss pipeline!")
+
+    all_gloss_dists = {}
+    for lemma, lines in zip(lemmas, all_lines):
+        if "".join(lines).strip():
+            all_gloss_dists[lemma] = parse_en_gloss_lines(lines, lemma,
+                                                          stopwords)
+    return all_gloss_dists
+
+
+def parse_en_gloss_lines(lines, lemma, stopwords):
+    """
+    Parse (tokenized, POS tagged and lemmatized) WordNet output for lemma to
+    obtain its gloss distributions
+
+    :param lines: lines of processed WordNet output
+    :param lemma: lemma WordNet output is for
+    :param stopwords: set of stopwords
+    :return: dist mapping sense ID to gloss distribution over words
+        (each represented by a Distribution)
+    """
+    lemma_parts = lemma.split(".")
+    pos = lemma_parts[-2]
+    lemma_base = ".".join(lemma_parts[:-2])
 
-    # process gloss input to produce distribution
     sense_gloss_dists = {}
-    start_pattern = re.compile("^the %s .* have [0-9]+ sens.*" % POS_MAP[pos])
+    start_pattern = START_PATTERNS[pos]
     start_parsing = False
     num_skip = 0
-    wn_out = p.stdout.read().strip()
-    if not wn_out:
-        raise ExperimentFail("Error in running wordnet!")
-    for line in wn_out.split("\n"):
-        data = ["_".join(item.split("_")[:-1]) for item in line.split()]
-        if start_pattern.match(" ".join(data)):
+    for line in lines:
+        # only lines starting with tagged "the" can match start pattern, so
+        # only strip tags to check pattern for those lines
+        if line.lstrip().startswith("the_") and start_pattern.match(
+                " ".join(["_".join(item.split("_")[:-1])
+                          for item in line.split()])):
             start_parsing = True
             num_skip = 1
 
@@ -119,7 +352,13 @@ def get_en_gloss_dists(lemma, wn_version, stopwords, tools_dir):
                 if i == 0:
                     sense_id = int(word.strip("."))
                 else:
-                    word = word.strip("\"").strip("'").strip(")").strip("(")
+                    # only strip words with punctuation at either end (the
+                    # strips stay chained, since a single strip(EDGE_PUNCT)
+                    # would turn '("x")' into 'x' rather than '"x"')
+                    if word and (word[0] in EDGE_PUNCT or
+                                 word[-1] in EDGE_PUNCT):
+                        word = word.strip("\"").strip("'").strip(")") \
+                            .strip("(")
                     if (word == lemma_base) or \
                        (len(word) < 3) or \
                        (word in stopwords) or \
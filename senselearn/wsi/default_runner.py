@@ -5,6 +5,74 @@ Last updated: July, 2016
 Superclass for running TM-WSI (either HDP-WSI or HCA-WSI)
 """
 
+import fcntl
+import os
+import random
+import subprocess
+from timeit import default_timer as timer
+
+# buffer size for reading / writing WSI input and output files, which can
+# be very large
+FILE_BUFFER_SIZE = 1 << 20
+
+# number of input lines to buffer between writes of WSI input file
+INPUT_WRITE_BATCH_SIZE = 4096
+
+
+def run_timed_process(args, stdout_path, stderr_path):
+    """
+    runs WSI executable, saving its stdout and stderr to files, and times it
+
+    :param args: list of command line arguments (starting with executable)
+    :param stdout_path: path to save stdout to
+    :param stderr_path: path to save stderr to
+    :return: wall time taken to run process (in seconds)
+    """
+    with open(stdout_path, 'w') as out_file, \
+            open(stderr_path, 'w') as err_file:
+        # the child gets these files as its stdout / stderr (via dup2), but
+        # they shouldn't leak into other processes started concurrently
+        # (e.g. by other worker threads) which don't close inherited fds
+        for fp in (out_file, err_file):
+            flags = fcntl.fcntl(fp.fileno(), fcntl.F_GETFD)
+            fcntl.fcntl(fp.fileno(), fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+        start_time = timer()
+        # close all other inherited fds in the child, so it doesn't hold
+        # open pipes etc. belonging to other worker threads (e.g. a gloss
+        # pipeline's stdout, which then never sees EOF)
+        proc = subprocess.Popen(args, stdout=out_file, stderr=err_file,
+                                shell=False, close_fds=True)
+        proc.wait()
+        return timer() - start_time
+
+
+def open_wsi_output(path):
+    """
+    opens WSI output file for reading; files are read sequentially from
+    start to end, so where possible kernel is told to read ahead
+    aggressively
+
+    :param path: path of file to open
+    :return: file object
+    """
+    fp = open(path, 'r', FILE_BUFFER_SIZE)
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return fp
+
+
+def get_topic_strs(topics):
+    """
+    formats topic-ID strings for all topics up to the largest one given
+
+    :param topics: list of topic numbers
+    :return: list mapping topic number to topic-ID string
+    """
+    if not topics:
+        return []
+    return ["t_%02d" % t for t in range(max(topics) + 1)]
+
+
 class WSIRunner:
     def __init__(self, corpus):
         """
@@ -24,3 +92,74 @@ class WSIRunner:
             metadata
         """
         raise NotImplementedError()
+
+    def _get_id_words(self, num_ids):
+        """
+        looks up word strings of word ID's in underlying corpus, so that
+        parsers can index into a list rather than querying corpus per record
+
+        :param num_ids: number of word ID's (starting from 0) to look up
+        :return: list mapping word ID to word string (None for invalid ID's)
+        """
+        id_to_word = self.corpus.id_to_word
+        return [id_to_word(word_id) for word_id in range(num_ids)]
+
+    def _subsample_lemma_usages(self, all_num_usages):
+        """
+        Sample set of lemma usages to run WSI on
+
+        :param all_num_usages: dict mapping lemma to the number of usages to
+            sample for that lemma
+        :return: set of document ID's (with respect to underlying corpus)
+            representing lemma usages to run WSI on
+        """
+        sampled_doc_ids = set()
+        for lemma, num_usages in all_num_usages.iteritems():
+            # for each lemma, sample a random set of usages of that lemma
+            doc_ids = self.corpus.get_doc_ids_by_lemma(lemma)
+            if num_usages >= len(doc_ids):
+                # all usages are used, so no need to sample
+                sampled_doc_ids.update(doc_ids)
+            else:
+                sampled_doc_ids.update(random.sample(doc_ids, num_usages))
+        return sampled_doc_ids
+
+    def _create_input(self, input_path, doc_subset):
+        """
+        Creates input file (in LDA-C format) for running WSI
+
+        :param input_path: path to save WSI input to
+        :param doc_subset: set of document ID's from underlying corpus to use
+            (if None, run WSI over all documents)
+        :return: tuple containing ID's of documents that are empty and non-empty
+            respectively (empty documents are not provided to WSI)
+        """
+        empty_list = []
+        non_empty_list = []
+        # lines are buffered and written out in batches
+        line_buffer = []
+        add_line = line_buffer.append
+
+        with open(input_path, 'w', FILE_BUFFER_SIZE) as fp:
+            write_lines = fp.writelines
+            for doc, bow in enumerate(self.corpus):
+                if (doc_subset is not None) and (doc not in doc_subset):
+                    # skip if document is not in subset we are considering
+                    continue
+                # skip empty documents
+                num_unique_words = len(bow)
+                if num_unique_words == 0:
+                    empty_list.append(doc)
+                    continue
+                # create string for current doc
+                add_line("%d %s\n" % (
+                    num_unique_words,
+                    " ".join(["%d:%d" % word_freq
+                              for word_freq in bow.iteritems()])))
+                non_empty_list.append(doc)
+                if len(line_buffer) >= INPUT_WRITE_BATCH_SIZE:
+                    write_lines(line_buffer)
+                    del line_buffer[:]
+            write_lines(line_buffer)
+
+        return empty_list, non_empty_list
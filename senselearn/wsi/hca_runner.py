@@ -7,14 +7,13 @@ Class for running HCA-WSI
 
 from collections import defaultdict
 from copy import copy
+from itertools import izip
 import os
-import random
-from timeit import timeit
-import re
 
 from senselearn.errors import ExperimentFail, WSIRepeat
 from senselearn.wsi_operator import INPUT_PATH, OUTPUT_DIR, OUTPUT_PREFIX
-from senselearn.wsi.default_runner import WSIRunner
+from senselearn.wsi.default_runner import WSIRunner, get_topic_strs, \
+    open_wsi_output, run_timed_process
 
 STDOUT_SUFFIX = ".stdout"
 STDERR_SUFFIX = ".stderr"
@@ -44,11 +43,56 @@ TOPICS_LINE_SKIP_NUM = 3
 DOC_LINE_SKIP_NUMBER = 3
 
 # patterns for parsing likelihood file
-LIKELIHOOD_LINE_PATTERN = re.compile("log_2\(perp\)=.*")
+LIKELIHOOD_LINE_PREFIX = "log_2(perp)="
 
 # cycles per line in likelihood file
 LIKELIHOOD_CHANGE_RATE = 5
 
+# cache of command line arguments built from each distinct set of options
+OPTION_ARGS_CACHE = {}
+
+
+def get_option_args(wsi_options):
+    """
+    builds command line arguments for HCA from options (excluding paths,
+    which differ between runs); arguments are cached, since the same options
+    are typically used for many runs
+
+    :param wsi_options: WSIOptions object containing options for running HCA
+    :return: tuple of command line arguments
+    """
+    option_items = frozenset(item for item in wsi_options.iteritems()
+                             if item[0] not in SKIP_OPTIONS)
+    try:
+        return OPTION_ARGS_CACHE[option_items]
+    except KeyError:
+        option_args = []
+        for option_name, option_val in wsi_options.iteritems():
+            # need to skip over some options
+            if option_name not in SKIP_OPTIONS:
+                option_args.append("-" + option_name)
+                if option_val:
+                    option_args.append(option_val)
+        option_args = tuple(option_args)
+        OPTION_ARGS_CACHE[option_items] = option_args
+        return option_args
+
+
+def read_int_columns(path, skip_lines, num_columns):
+    """
+    reads file made up of lines of integers (after some header lines)
+
+    :param path: path of file to read
+    :param skip_lines: number of header lines to skip
+    :param num_columns: number of integers on each line
+    :return: list containing a list of ints for each column
+    """
+    with open_wsi_output(path) as fp:
+        for _ in range(skip_lines):
+            fp.readline()
+        values = map(int, fp.read().split())
+    return [values[i::num_columns] for i in range(num_columns)]
+
 
 class HCARunner(WSIRunner):
     """
@@ -107,37 +151,18 @@ class HCARunner(WSIRunner):
             usage_subset = self._subsample_lemma_usages(all_num_usages)
         else:
             usage_subset = None
-        empty, non_empty = self._create_hca_input(wsi_input_path, usage_subset)
+        empty, non_empty = self._create_input(wsi_input_path, usage_subset)
 
         # build up argument list to execute
         hca_option_list = [wsi_exe_path, "-e"]
-        for option_name, option_val in wsi_options.iteritems():
-            # need to skip over some options
-            if option_name not in SKIP_OPTIONS:
-                hca_option_list.append("-" + option_name)
-                if option_val:
-                    hca_option_list.append(option_val)
+        hca_option_list.extend(get_option_args(wsi_options))
         # add input stem and output stem options
         hca_option_list.append(".".join(wsi_input_path.split(".")[:-1]))
         hca_option_list.append(wsi_output_stem)
 
-        # run hca, and save stdout in out_file
-        # (this very complex setup is to obtain accurate running time)
-        out_file = open(wsi_stdout_path, 'w')
-
-        wsi_setup_str = "out_file = open('%s', 'w')\n" % wsi_stdout_path
-        wsi_setup_str += "err_file = open('%s', 'w')\n" % wsi_stderr_path
-        wsi_setup_str += "import subprocess"
-
-        wsi_call_str = ("subprocess.call(%s, stdout=out_file, "
-                        "stderr=err_file, shell=False)\n" %
-                        str(hca_option_list))
-        wsi_call_str += "err_file.close()\n"
-        wsi_call_str += "out_file.close()"
-
-        # run hca once, timing the process
-        time_taken = timeit(stmt=wsi_call_str, setup=wsi_setup_str, number=1)
-        out_file.close()
+        # run hca, saving stdout and stderr, and time the process
+        time_taken = run_timed_process(hca_option_list, wsi_stdout_path,
+                                       wsi_stderr_path)
 
         return self._parse_hca_results(wsi_output_stem, wsi_stderr_path,
                                       non_empty, time_taken)
@@ -151,68 +176,17 @@ class HCARunner(WSIRunner):
         :return: list containing perplexity values
             (length = number of iterations)
         """
-        fp = open(perplexity_path, 'r')
         likelihood_array = []
-        for line in fp.xreadlines():
-            line = line.strip()
-            # start of new cycles set
-            if LIKELIHOOD_LINE_PATTERN.match(line):
-                likelihood = float(line.split("=")[1].split(",")[0])
-                for _ in range(LIKELIHOOD_CHANGE_RATE):
-                    likelihood_array.append(likelihood)
+        with open_wsi_output(perplexity_path) as fp:
+            for line in fp:
+                line = line.strip()
+                # start of new cycles set
+                if line.startswith(LIKELIHOOD_LINE_PREFIX):
+                    likelihood = float(line.split("=")[1].split(",")[0])
+                    likelihood_array.extend(
+                        [likelihood] * LIKELIHOOD_CHANGE_RATE)
         return likelihood_array
 
-    def _subsample_lemma_usages(self, all_num_usages):
-        """
-        Sample set of lemma usages to run HCA on
-
-        :param all_num_usages: dict mapping lemma to the number of usages to
-            sample for that lemma
-        :return: set of document ID's (with respect to underlying corpus)
-            representing lemma usages to run HCA on
-        """
-        sampled_doc_ids = set()
-        for lemma, num_usages in all_num_usages.iteritems():
-            # for each lemma, sample a random set of usages of that lemma
-            doc_ids = self.corpus.get_doc_ids_by_lemma(lemma)
-            num_subsample = min(len(doc_ids), num_usages)
-            for doc_id in random.sample(doc_ids, num_subsample):
-                sampled_doc_ids.add(doc_id)
-        return sampled_doc_ids
-
-    def _create_hca_input(self, hca_input_path, doc_subset):
-        """
-        Creates input file running HCA
-
-        :param hca_input_path: path to save HCA input to
-        :param doc_subset: set of document ID's from underlying corpus to use
-            (if None, run HCA over all documents)
-        :return: tuple containing ID's of documents that are empty and non-empty
-            respectively (empty documents are not provided to HCA)
-        """
-        empty_list = []
-        non_empty_list = []
-        fp = open(hca_input_path, 'w')
-
-        for doc, bow in enumerate(self.corpus):
-            if (doc_subset is not None) and (doc not in doc_subset):
-                # skip if document is not in subset we are considering
-                continue
-            # skip empty documents
-            num_unique_words = len(bow.keys())
-            if num_unique_words == 0:
-                empty_list.append(doc)
-                continue
-            # create string for current doc
-            input_line = str(num_unique_words)
-            for word, freq in bow.iteritems():
-                input_line += " " + str(word) + ":" + str(freq)
-            fp.write(input_line + "\n")
-            non_empty_list.append(doc)
-
-        fp.close()
-        return empty_list, non_empty_list
-
     def _parse_hca_results(self, wsi_output_stem, hca_stderr_path,
                            non_empty, time_taken):
         """
@@ -251,23 +225,16 @@ class HCARunner(WSIRunner):
         :param topic_word_assignment_path: path to topic-word counts file
         :return: dict mapping topic-ID to dict containing word counts
         """
-
-        def get_topic_str(t_):
-            return "t_%02d" % t_
-
-        fp = open(topic_word_assignment_path, 'r')
-        lines = fp.xreadlines()
         topic_word_counts = defaultdict(dict)
-        for _ in range(TOPICS_LINE_SKIP_NUM):
-            lines.next()
-
-        # read in all topic-word frequency data
-        for line in lines:
-            word_id, topic, count = map(int, line.strip().split())
-            word = self.corpus.id_to_word(word_id)
-            topic_id = get_topic_str(topic)
-            topic_word_counts[topic_id][word] = count
-        fp.close()
+
+        # read in all topic-word frequency data, converting the whole file to
+        # ints in one go
+        word_ids, topics, counts = read_int_columns(
+            topic_word_assignment_path, TOPICS_LINE_SKIP_NUM, 3)
+        topic_strs = get_topic_strs(topics)
+        words = self._get_id_words(max(word_ids) + 1 if word_ids else 0)
+        for word_id, topic, count in izip(word_ids, topics, counts):
+            topic_word_counts[topic_strs[topic]][words[word_id]] = count
         return topic_word_counts
 
     @staticmethod
@@ -284,20 +251,18 @@ class HCARunner(WSIRunner):
         def get_doc_str(d_):
             return "d_%06d" % d_
 
-        def get_topic_str(t_):
-            return "t_%02d" % t_
-
-        fp = open(doc_word_assignment_path, 'r')
-        lines = fp.xreadlines()
         doc_topic_counts = defaultdict(dict)
-        for _ in range(DOC_LINE_SKIP_NUMBER):
-            lines.next()
-
-        # obtain doc distributions for all non-empty documents
-        for line in lines:
-            d, topic, count = map(int, line.strip().split())
-            doc_id = get_doc_str(non_empty_list[d])
-            topic_id = get_topic_str(topic)
-            doc_topic_counts[doc_id][topic_id] = count
-        fp.close()
+
+        # obtain doc distributions for all non-empty documents (doc-ID is
+        # only looked up when the document changes from the previous line)
+        docs, topics, counts = read_int_columns(
+            doc_word_assignment_path, DOC_LINE_SKIP_NUMBER, 3)
+        topic_strs = get_topic_strs(topics)
+        last_d = None
+        doc_counts = None
+        for d, topic, count in izip(docs, topics, counts):
+            if d != last_d:
+                doc_counts = doc_topic_counts[get_doc_str(non_empty_list[d])]
+                last_d = d
+            doc_counts[topic_strs[topic]] = count
         return doc_topic_counts
@@ -5,16 +5,15 @@ Last updated: July, 2016
 Class for running HDP-WSI
 """
 
-from collections import defaultdict
+from collections import Counter, defaultdict
 from copy import copy
+from itertools import imap
 import os
-import random
-from timeit import timeit
-import re
 
 from senselearn.errors import ExperimentFail, WSIRepeat
 from senselearn.wsi_operator import INPUT_PATH, OUTPUT_DIR, OUTPUT_PREFIX
-from senselearn.wsi.default_runner import WSIRunner
+from senselearn.wsi.default_runner import WSIRunner, get_topic_strs, \
+    open_wsi_output, run_timed_process
 
 STDOUT_SUFFIX = ".stdout"
 STDERR_SUFFIX = ".stderr"
@@ -33,9 +32,42 @@ HDP_OPTION_DEFAULTS = {
 }
 
 SKIP_OPTIONS = (INPUT_PATH, OUTPUT_DIR, OUTPUT_PREFIX, EXE_PATH)
+# options which differ between runs, so are added to arguments separately
+PATH_OPTIONS = (HDP_INPUT_PATH_KEY, HDP_OUTPUT_DIR_KEY)
 
-LIKELIHOOD_LINE_PATTERN = re.compile("^iter = .* likelihood = ")
-NUM_WORDS_LINE_PATTERN = re.compile("^number of total words")
+# cache of command line arguments built from each distinct set of options
+OPTION_ARGS_CACHE = {}
+
+# likelihood lines start with prefix, and contain marker somewhere after it
+LIKELIHOOD_LINE_PREFIX = "iter = "
+LIKELIHOOD_LINE_MARKER = " likelihood = "
+NUM_WORDS_LINE_PREFIX = "number of total words"
+
+
+def get_option_args(hdp_options):
+    """
+    builds command line arguments for HDP from options (excluding paths,
+    which differ between runs); arguments are cached, since the same options
+    are typically used for many runs
+
+    :param hdp_options: WSIOptions object containing options for running HDP
+    :return: tuple of command line arguments
+    """
+    option_items = frozenset(
+        item for item in hdp_options.iteritems()
+        if item[0] not in SKIP_OPTIONS and item[0] not in PATH_OPTIONS)
+    try:
+        return OPTION_ARGS_CACHE[option_items]
+    except KeyError:
+        option_args = []
+        for option_name, option_val in hdp_options.iteritems():
+            # need to skip over some options
+            if (option_name, option_val) in option_items:
+                option_args.append("--" + option_name)
+                option_args.append(option_val)
+        option_args = tuple(option_args)
+        OPTION_ARGS_CACHE[option_items] = option_args
+        return option_args
 
 
 class HDPRunner(WSIRunner):
@@ -93,33 +125,18 @@ class HDPRunner(WSIRunner):
             usage_subset = self._subsample_lemma_usages(all_num_usages)
         else:
             usage_subset = None
-        empty, non_empty = self._create_hdp_input(hdp_input_path, usage_subset)
+        empty, non_empty = self._create_input(hdp_input_path, usage_subset)
 
         # build up argument list to execute
         hdp_option_list = [hdp_exe_path]
-        for option_name, option_val in hdp_options.iteritems():
-            # need to skip over some options
-            if option_name not in SKIP_OPTIONS:
-                hdp_option_list.append("--" + option_name)
-                hdp_option_list.append(option_val)
-
-        # run hdp, and save stdout in out_file
-        # (this very complex setup is to obtain accurate running time)
-        out_file = open(hdp_stdout_path, 'w')
+        hdp_option_list.extend(get_option_args(hdp_options))
+        # add input path and output dir options
+        hdp_option_list.extend(["--" + HDP_INPUT_PATH_KEY, hdp_input_path,
+                                "--" + HDP_OUTPUT_DIR_KEY, hdp_output_dir])
 
-        hdp_setup_str = "out_file = open('%s', 'w')\n" % hdp_stdout_path
-        hdp_setup_str += "err_file = open('%s', 'w')\n" % hdp_stderr_path
-        hdp_setup_str += "import subprocess"
-
-        hdp_call_str = ("subprocess.call(%s, stdout=out_file, "
-                        "stderr=err_file, shell=False)\n" %
-                        str(hdp_option_list))
-        hdp_call_str += "err_file.close()\n"
-        hdp_call_str += "out_file.close()"
-
-        # run hdp once, timing the process
-        time_taken = timeit(stmt=hdp_call_str, setup=hdp_setup_str, number=1)
-        out_file.close()
+        # run hdp, saving stdout and stderr, and time the process
+        time_taken = run_timed_process(hdp_option_list, hdp_stdout_path,
+                                       hdp_stderr_path)
 
         return self._parse_hdp_wsi_results(hdp_output_dir, hdp_stdout_path,
                                            non_empty, time_taken)
@@ -134,73 +151,24 @@ class HDPRunner(WSIRunner):
             (length = number of iterations)
         """
         perplexity_array = []
-        fp = open(likelihood_path, 'r')
         # iterate over lines in file, extracting likelihood from all
         # lines matching pattern
         num_words = None
-        for line in fp.readlines():
-            if NUM_WORDS_LINE_PATTERN.match(line):
-                tokens = line.split()
-                num_words = int(tokens[-1])
-            elif LIKELIHOOD_LINE_PATTERN.match(line):
-                tokens = line.strip().split()
-                likelihood = float(tokens[-1])
-                perplexity = -1 * likelihood / num_words
-                perplexity_array.append(perplexity)
+        with open_wsi_output(likelihood_path) as fp:
+            for line in fp:
+                if line.startswith(NUM_WORDS_LINE_PREFIX):
+                    tokens = line.split()
+                    num_words = int(tokens[-1])
+                elif line.startswith(LIKELIHOOD_LINE_PREFIX) and \
+                        line.find(LIKELIHOOD_LINE_MARKER,
+                                  len(LIKELIHOOD_LINE_PREFIX)) != -1:
+                    tokens = line.split()
+                    likelihood = float(tokens[-1])
+                    perplexity = -1 * likelihood / num_words
+                    perplexity_array.append(perplexity)
 
         return perplexity_array
 
-    def _subsample_lemma_usages(self, all_num_usages):
-        """
-        Sample set of lemma usages to run HDP on
-
-        :param all_num_usages: dict mapping lemma to the number of usages to
-            sample for that lemma
-        :return: set of document ID's (with respect to underlying corpus)
-            representing lemma usages to run HDP on
-        """
-        sampled_doc_ids = set()
-        for lemma, num_usages in all_num_usages.iteritems():
-            # for each lemma, sample a random set of usages of that lemma
-            doc_ids = self.corpus.get_doc_ids_by_lemma(lemma)
-            num_subsample = min(len(doc_ids), num_usages)
-            for doc_id in random.sample(doc_ids, num_subsample):
-                sampled_doc_ids.add(doc_id)
-        return sampled_doc_ids
-
-    def _create_hdp_input(self, hdp_input_path, doc_subset):
-        """
-        Creates input file running HDP
-
-        :param hdp_input_path: path to save HDP input to
-        :param doc_subset: set of document ID's from underlying corpus to use
-            (if None, run HDP over all documents)
-        :return: tuple containing ID's of documents that are empty and non-empty
-            respectively (empty documents are not provided to HDP)
-        """
-        fp = open(hdp_input_path, 'w')
-        empty_list = []
-        non_empty_list = []
-
-        for doc, bow in enumerate(self.corpus):
-            if (doc_subset is not None) and (doc not in doc_subset):
-                # skip if document is not in subset we are considering
-                continue
-            # skip empty documents
-            num_unique_words = len(bow.keys())
-            if num_unique_words == 0:
-                empty_list.append(doc)
-                continue
-            # create string for current doc
-            input_line = str(num_unique_words)
-            for word, freq in bow.iteritems():
-                input_line += " " + str(word) + ":" + str(freq)
-            fp.write(input_line + "\n")
-            non_empty_list.append(doc)
-
-        fp.close()
-        return empty_list, non_empty_list
-
     def _parse_hdp_wsi_results(self, hdp_output_dir, hdp_stdout_path,
                                non_empty, time_taken):
         """
@@ -246,15 +214,21 @@ class HDPRunner(WSIRunner):
             return "t_%02d" % t_
 
         topic_word_counts = defaultdict(dict)
-        fp = open(topics_path, 'r')
-        for topic_num, line in enumerate(fp.readlines()):
-            topic_id = get_topic_str(topic_num)
-            counts = map(int, line.strip().split())
-            for word_id, count in enumerate(counts):
-                if count > 0:
-                    word = self.corpus.id_to_word(word_id)
-                    topic_word_counts[topic_id][word] = count
-        fp.close()
+        words = None
+        with open_wsi_output(topics_path) as fp:
+            for topic_num, line in enumerate(fp):
+                # each line is a dense row of counts over the vocabulary
+                tokens = line.split()
+                non_zero = [(word_id, count)
+                            for word_id, count in enumerate(map(int, tokens))
+                            if count > 0]
+                # topics without any words are not added
+                if not non_zero:
+                    continue
+                if words is None:
+                    words = self._get_id_words(len(tokens))
+                topic_word_counts[get_topic_str(topic_num)].update(
+                    (words[word_id], count) for word_id, count in non_zero)
         return topic_word_counts
 
     @staticmethod
@@ -270,25 +244,19 @@ class HDPRunner(WSIRunner):
         def get_doc_str(d_):
             return "d_%06d" % d_
 
-        def get_topic_str(t_):
-            return "t_%02d" % t_
-
-        fp = open(word_assignments_path, 'r')
-        doc_topic_counts = defaultdict(dict)
-        for i, line in enumerate(fp.readlines()):
+        # count (doc, topic) pairs over all word assignments in one go
+        with open_wsi_output(word_assignments_path) as fp:
             # skip the first line
-            if i == 0:
-                continue
-            # get doc-id for line
-            tokens = line.strip().split()
-            d = int(tokens[0])
+            fp.readline()
+            pair_counts = Counter((tokens[0], tokens[2]) for tokens
+                                  in imap(str.split, fp))
+
+        # build up nested counts from the distinct (doc, topic) pairs
+        pair_counts = [(int(d), int(topic), count)
+                       for (d, topic), count in pair_counts.iteritems()]
+        topic_strs = get_topic_strs([topic for _, topic, _ in pair_counts])
+        doc_topic_counts = defaultdict(dict)
+        for d, topic, count in pair_counts:
             doc_id = get_doc_str(non_empty_list[d])
-            topic = int(tokens[2])
-            topic_id = get_topic_str(topic)
-            # update count for this doc_id / topic combination
-            try:
-                doc_topic_counts[doc_id][topic_id] += 1
-            except KeyError:
-                doc_topic_counts[doc_id][topic_id] = 1
-        fp.close()
+            doc_topic_counts[doc_id][topic_strs[topic]] = count
         return doc_topic_counts
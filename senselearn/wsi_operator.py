@@ -7,6 +7,8 @@ Provides functions/classes for running WSI (either HDP-WSI or HCA-WSI)
 
 import os
 from copy import copy
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 from senselearn.errors import ExperimentFail
 
@@ -71,6 +73,69 @@ class WSIOperator:
         :return: dict containing topic modelling output from underlying TM-WSI
             algorithm
         """
+        wsi_options = self._prepare_wsi_options(supplied_wsi_options)
+
+        # actually run wsi with given options
+        return self.wsi_runner.run_wsi(wsi_options, all_num_usages)
+
+    def run_wsi_batch(self, supplied_options_list, all_num_usages=None,
+                      nprocs=None):
+        """
+        runs WSI several times concurrently (e.g. with different options or
+        random subsamples), each run using its own input path and output
+        files; runs are launched from a pool of threads, as the time is spent
+        in the WSI subprocesses rather than in Python
+
+        :param supplied_options_list: list of provided WSI options (one per
+            run) to override default options of this class
+        :param all_num_usages: dict supplying number of usages to run TM-WSI on
+            for each lemma (if None, run on all usages in corpus)
+        :param nprocs: maximum number of WSI runs to have going at once (if
+            None, use number of CPUs)
+        :return: list containing topic modelling output dict of each run, in
+            the same order as supplied_options_list
+        """
+        # set up all options first, so any problems are found before running
+        all_wsi_options = [self._prepare_wsi_options(supplied_wsi_options)
+                           for supplied_wsi_options in supplied_options_list]
+        input_paths = set()
+        output_stems = set()
+        for wsi_options in all_wsi_options:
+            input_path = wsi_options[INPUT_PATH]
+            output_stem = (wsi_options[OUTPUT_DIR], wsi_options[OUTPUT_PREFIX])
+            if input_path in input_paths:
+                raise ExperimentFail("Input path %s used by multiple WSI runs"
+                                     % input_path)
+            elif output_stem in output_stems:
+                raise ExperimentFail("Output prefix %s in %s used by multiple "
+                                     "WSI runs"
+                                     % (output_stem[1], output_stem[0]))
+            input_paths.add(input_path)
+            output_stems.add(output_stem)
+
+        # prepare vocab up front, so that runs don't race to do it
+        if not self.corpus.vocab_up_to_date:
+            self.corpus.prepare_vocab()
+
+        def run_one(wsi_options):
+            return self.wsi_runner.run_wsi(wsi_options, all_num_usages)
+
+        pool = ThreadPool(nprocs or cpu_count())
+        try:
+            return pool.map(run_one, all_wsi_options)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _prepare_wsi_options(self, supplied_wsi_options):
+        """
+        fills in default options, checks that vital options are set, and
+        creates input / output directories for a run of WSI
+
+        :param supplied_wsi_options: provided WSI options to override default
+            options of this class
+        :return: WSIOptions object with all options for run
+        """
         # first set un-chosen options to defaults
         wsi_options = copy(supplied_wsi_options)
         for option_key, option_value in self.default_options.iteritems():
@@ -107,5 +172,4 @@ class WSIOperator:
                                      "creating output directory %s"
                                      % output_dir)
 
-        # actually run wsi with given options
-        return self.wsi_runner.run_wsi(wsi_options, all_num_usages)
+        return wsi_options
@@ -13,21 +13,11 @@ Date:           Sep 11
 
 import sys
 
-topics=[] #[[topic1], [topic2], ...]
-line_id = 0
-for line in sys.stdin:
-    data = line.strip().split()
+lines = iter(sys.stdin)
+#first line gives the number of topics
+topics = [[] for _ in next(lines, "").split()] #[[topic1], [topic2], ...]
+for line in lines:
+    for topic_words, word in zip(topics, line.split()):
+        topic_words.append(word)
 
-    if line_id == 0:
-        for i in range(0, len(data)):
-            topics.append([])
-    else:
-        for i in range(0, len(data)):
-            topic_words = topics.pop(i)
-            topic_words.append(data[i])
-            topics.insert(i, topic_words)
-
-    line_id += 1
-
-for topic in topics:
-    print " ".join(topic)
+sys.stdout.write("".join(" ".join(topic) + "\n" for topic in topics))
@@ -13,6 +13,7 @@ Date:           June 12
 import sys
 import pickle
 import operator
+from itertools import izip
 
 #parameters
 debug = False
@@ -25,7 +26,7 @@ if len(sys.argv) != 4:
 #input
 tw_file = open(sys.argv[1])
 vocab_file = open(sys.argv[2])
-output_pickle = open(sys.argv[3], "w")
+output_pickle = open(sys.argv[3], "wb")
 
 #global variables
 vocabs = []
@@ -38,15 +39,12 @@ for line in vocab_file:
 
 topic_id = 1
 for line in tw_file:
-    wordprob = {}
-
     #collect frequency for each vocab
     freqs = map(int, line.split()[1:])
-    total_freq = sum(freqs)
+    total_freq = float(sum(freqs))
 
-    for (i, freq) in enumerate(freqs):
-        if freq > 0:
-            wordprob[vocabs[i]] = float(freq)/total_freq 
+    wordprob = dict((vocab, freq/total_freq)
+                    for (vocab, freq) in izip(vocabs, freqs) if freq > 0)
 
     #add to the topic_wordprob dictionary
     topic_wordprob[topic_id] = wordprob 
@@ -60,4 +58,6 @@ if debug:
             print word + "/" + ("%.3f" % prob),
         print
 
-pickle.dump(topic_wordprob, output_pickle)
+#binary protocol is smaller and faster to load than the default ascii one
+pickle.dump(topic_wordprob, output_pickle, pickle.HIGHEST_PROTOCOL)
+output_pickle.close()